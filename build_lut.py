@@ -0,0 +1,88 @@
+import os
+import time
+import numpy as np
+import stim
+
+from custom_decoders.uf_arch.lut_decoder import LookupTable, UFArchLUTCompiledDecoder, tablePath, sampleSyndromes, enumerateSyndromes
+from custom_decoders.uf_arch.uf_arch_decoder import UFArchCompiledDecoder, UFArchParams
+from error_models.superconductive_em import SuperconductiveEM
+
+# Small memory experiments (the low end of FACTORS["distance"] in experimental_setup/config.py)
+DISTANCES = [3, 5]
+ROUNDS = [25]
+ERROR_RATE = 0.001
+
+# Syndromes tabulated: the sampled ones, and every syndrome with up to MAX_WEIGHT detection events
+TABLE_SHOTS = 10**6
+MAX_WEIGHT = 2
+
+# Fresh shots to measure the hit rate and the latency
+TEST_SHOTS = 10**5
+
+LUT_DIR = "./experimental_setup/luts"
+
+def buildTable(circuit: stim.Circuit, shots=TABLE_SHOTS, maxWeight=MAX_WEIGHT, tableDir=LUT_DIR, seed=None):
+    """
+    Builds the lookup table of a circuit, decoding its syndromes offline with uf_arch,
+    and saves it in tableDir (see tablePath), where UFArchLUTDecoder finds it.
+    """
+    dem = circuit.detector_error_model()
+    decoder = UFArchCompiledDecoder(UFArchParams(codeType="rotated"), dem)
+
+    syndromes = [sampleSyndromes(circuit, shots, seed)]
+    if maxWeight >= 0:
+        syndromes.append(enumerateSyndromes(dem.num_detectors, maxWeight))
+
+    table = LookupTable.build(dem, np.concatenate(syndromes), decoder.decodeRows)
+
+    os.makedirs(tableDir, exist_ok=True)
+    path = tablePath(tableDir, dem)
+    table.save(path)
+
+    return path, table
+
+def tableReport(distance, rounds, errorRate=ERROR_RATE, tableDir=LUT_DIR):
+    """
+    Builds the table of a memory experiment, and compares the per-shot latency of the
+    lookup-table decoder with the one of uf_arch on the same fresh shots.
+    """
+    circuit = stim.Circuit.generated("surface_code:rotated_memory_z", rounds=rounds, distance=distance, **SuperconductiveEM(errorRate).toStim())
+    dem = circuit.detector_error_model()
+
+    path, _ = buildTable(circuit, tableDir=tableDir, seed=1)
+
+    detectionEvents, observables = circuit.compile_detector_sampler(seed=2).sample(TEST_SHOTS, separate_observables=True, bit_packed=True)
+
+    ufDecoder = UFArchCompiledDecoder(UFArchParams(codeType="rotated"), dem)
+    lutDecoder = UFArchLUTCompiledDecoder(UFArchParams(codeType="rotated"), dem, LookupTable.load(path))
+
+    start = time.perf_counter()
+    ufPredictions = ufDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=detectionEvents)
+    ufLatency = (time.perf_counter() - start) / TEST_SHOTS
+
+    start = time.perf_counter()
+    lutPredictions = lutDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=detectionEvents)
+    lutLatency = (time.perf_counter() - start) / TEST_SHOTS
+
+    return {
+        "d": distance,
+        "r": rounds,
+        "p": errorRate,
+        "entries": len(LookupTable.load(path)),
+        "file_bytes": os.path.getsize(path),
+        "hit_rate": lutDecoder.hits / max(lutDecoder.hits + lutDecoder.misses, 1),
+        "uf_latency_us": ufLatency * 1e6,
+        "lut_latency_us": lutLatency * 1e6,
+        "uf_errors": int(np.count_nonzero(ufPredictions[:, 0] & 1 != observables[:, 0])),
+        "lut_errors": int(np.count_nonzero(lutPredictions[:, 0] & 1 != observables[:, 0])),
+    }
+
+if __name__ == "__main__":
+    for distance in DISTANCES:
+        for rounds in ROUNDS:
+            row = tableReport(distance, rounds)
+
+            print(f"d={row['d']} r={row['r']}: {row['entries']} entries ({row['file_bytes'] / 2**20:.1f} MiB), "
+                  f"hit rate {row['hit_rate']:.2f} (of the shots with detection events), "
+                  f"{row['uf_latency_us']:.2f} -> {row['lut_latency_us']:.2f} us/shot, "
+                  f"errors {row['uf_errors']} -> {row['lut_errors']}")
@@ -0,0 +1,51 @@
+import numpy as np
+
+class ShotTriage():
+    """
+    Triage stage of the sinter adapters: shots without detection events are predicted
+    without entering the decoder (no detection event, no correction, so no observable
+    flip), and only the other shots are sent to the decoder.
+
+    Attributes
+    ----------
+    totalShots : int
+        The number of shots seen by the triage.
+    triagedShots : int
+        The number of shots predicted by the triage (without detection events).
+    """
+    def __init__(self):
+        self.totalShots = 0
+        self.triagedShots = 0
+
+    @property
+    def triagedFraction(self) -> float:
+        return self.triagedShots / self.totalShots if self.totalShots else 0.0
+
+    def decode(self, packedShots: np.ndarray, numObservables: int, decodeRows) -> np.ndarray:
+        """
+        Predicts a batch of bit-packed shots, decoding only the shots with detection events.
+
+        Parameters:
+            packedShots (np.ndarray): The (num_shots, ceil(num_dets/8)) bit-packed detection events.
+            numObservables (int): The number of observables of the predictions.
+            decodeRows (callable): Decodes a bit-packed batch of shots into its bit-packed predictions.
+
+        Returns:
+            np.ndarray: The (num_shots, ceil(numObservables/8)) bit-packed predictions.
+        """
+        packedShots = np.atleast_2d(packedShots)
+        predictions = np.zeros((len(packedShots), (numObservables + 7) // 8), dtype=np.uint8)
+
+        # A single vectorized pass over the packed rows
+        rows = np.flatnonzero(packedShots.any(axis=1))
+
+        self.totalShots += len(packedShots)
+        self.triagedShots += len(packedShots) - len(rows)
+
+        if len(rows) == len(packedShots):
+            return decodeRows(packedShots)
+
+        if len(rows):
+            predictions[rows] = decodeRows(packedShots[rows])
+
+        return predictions
@@ -0,0 +1,83 @@
+import numpy as np
+import stim
+
+BORDER_NODE = -1
+
+class DemGraph():
+    """
+    Decoding graph of a detector error model, for the uf_arch decoder built on an
+    arbitrary graph (uf.CodeType.GRAPH): every detector is a node, and every graphlike
+    error mechanism is an edge between its two detectors, or between its detector and
+    the border. Any code and noise model are supported, including space-time diagonal edges.
+
+    Attributes
+    ----------
+    numNodes : int
+        The number of nodes of the graph (one per detector).
+    edgeNodes : np.ndarray
+        The (num_edges, 2) int32 array of the endpoints of each edge, BORDER_NODE for the border.
+    edgeObservables : np.ndarray
+        The uint64 mask of the logical observables flipped by each edge (bit i for observable i).
+    detToNode : np.ndarray
+        For each detector, its node (the identity, for a common interface with DetectorMapping).
+    """
+    def __init__(self, numNodes: int, edgeNodes: np.ndarray, edgeObservables: np.ndarray):
+        self.numNodes = numNodes
+        self.edgeNodes = np.ascontiguousarray(edgeNodes, dtype=np.int32).reshape(-1, 2)
+        self.edgeObservables = np.ascontiguousarray(edgeObservables, dtype=np.uint64)
+        self.detToNode = np.arange(numNodes, dtype=np.int32)
+
+    @classmethod
+    def from_dem(cls, dem: stim.DetectorErrorModel):
+        """
+        Builds the graph of a detector error model, which should be decomposed into graphlike
+        errors (decompose_errors=True): the components of an error mechanism with more than two
+        detectors have no edge.
+        """
+        endpointMasks = graphlikeErrors(dem, np.arange(dem.num_detectors))
+
+        edgeNodes = np.array(list(endpointMasks.keys()), dtype=np.int32).reshape(-1, 2)
+        edgeObservables = np.array([mask for _, mask in endpointMasks.values()], dtype=np.uint64)
+
+        return cls(dem.num_detectors, edgeNodes, edgeObservables)
+
+def graphlikeErrors(dem: stim.DetectorErrorModel, detToNode: np.ndarray) -> dict:
+    """
+    Collects the graphlike error mechanisms of a detector error model: the components
+    (separated by ^ in decomposed errors) with one or two detectors, all mapped on a node.
+
+    Parameters:
+        dem (stim.DetectorErrorModel): The detector error model.
+        detToNode (np.ndarray): For each detector, its node, or -1 if the detector is filtered out.
+
+    Returns:
+        dict: For each pair of endpoints (BORDER_NODE, node) or (nodeA, nodeB) with nodeA < nodeB,
+              the (probability, observable mask) of its most likely mechanism, in order of first appearance.
+    """
+    if dem.num_observables > 64:
+        raise ValueError("At most 64 observables are supported.")
+
+    endpointMasks = {}
+
+    for instruction in dem.flattened():
+        if instruction.type != "error":
+            continue
+
+        probability = instruction.args_copy()[0]
+        nodes, mask = [], 0
+
+        for target in instruction.targets_copy() + [stim.target_separator()]:
+            if target.is_separator():
+                if 0 < len(nodes) <= 2 and -1 not in nodes:
+                    key = (min(nodes), max(nodes)) if len(nodes) == 2 else (BORDER_NODE, nodes[0])
+
+                    if probability > endpointMasks.get(key, (-1, 0))[0]:
+                        endpointMasks[key] = (probability, mask)
+
+                nodes, mask = [], 0
+            elif target.is_relative_detector_id():
+                nodes.append(int(detToNode[target.val]))
+            elif target.is_logical_observable_id():
+                mask ^= 1 << target.val
+
+    return endpointMasks
@@ -0,0 +1,133 @@
+import numpy as np
+import stim
+
+from custom_decoders.uf_arch.dem_graph import graphlikeErrors
+
+class DetectorMapping():
+    """
+    Precomputed mapping from Stim detector indices to uf_arch lattice nodes (rotated code).
+
+    The mapping is built once per detector error model, so that converting a batch of
+    detection events into uf_arch syndromes is a single vectorized gather instead of a
+    per-shot walk over the detector coordinates.
+
+    Attributes
+    ----------
+    distance : int
+        The code distance.
+    rounds : int
+        The number of rounds (layers) of the uf_arch lattice.
+    numNodes : int
+        The number of nodes of the uf_arch lattice.
+    detToNode : np.ndarray
+        For each detector, the index of its node in the lattice, or -1 if the detector is filtered out.
+    nodeToDet : np.ndarray
+        For each node, the index of its detector, or numDets if no detector is mapped on it.
+    """
+    def __init__(self, detToNode: np.ndarray, distance: int, rounds: int, numNodes: int | None = None):
+        self.distance = distance
+        self.rounds = rounds
+        self.numNodes = numNodes if numNodes is not None else rounds * (distance + 1) * ((distance - 1) // 2)
+
+        self.detToNode = np.ascontiguousarray(detToNode, dtype=np.int32)
+        self.numDets = len(self.detToNode)
+
+        mappedDets = np.flatnonzero(self.detToNode >= 0)
+        self.nodeToDet = np.full(self.numNodes, self.numDets, dtype=np.intp)
+        self.nodeToDet[self.detToNode[mappedDets]] = mappedDets
+
+    @classmethod
+    def from_dem(cls, dem: stim.DetectorErrorModel):
+        detCoords = dem.get_detector_coordinates()
+        coords = np.array([detCoords[i] for i in range(dem.num_detectors)], dtype=float)
+
+        distance = int(coords[-1][0] / 2) # the last coordinate is the one with the highest x value, so take it and halve it
+        rounds = int(coords[:, 2].max()) + 1
+
+        rowLen = (distance - 1) // 2
+        columnLen = distance + 1
+        roundLen = rowLen * columnLen
+
+        x, y, t = coords[:, 0], coords[:, 1], coords[:, 2]
+
+        # Only Z stabilizers are mapped on the lattice
+        isZStabilizer = (x // 2) % 2 == (y // 2) % 2
+
+        unrolledCoords = (t * roundLen + (y // 2 - 1) * columnLen // 2 + x // 4).astype(np.int64)
+
+        # Stim orders the stabilizers of a round differently from the lattice rows,
+        # so each round is permuted (see rotatedPermutation)
+        permutation = rotatedPermutation(distance)
+        nodes = unrolledCoords // roundLen * roundLen + permutation[unrolledCoords % roundLen]
+
+        detToNode = np.where(isZStabilizer, nodes, -1)
+
+        return cls(detToNode, distance, rounds)
+
+    def apply(self, detectionEvents: np.ndarray, packed: bool = False) -> np.ndarray:
+        """
+        Converts a batch of detection events into a batch of uf_arch syndromes.
+
+        Parameters:
+            detectionEvents (np.ndarray): A (num_shots, num_dets) boolean array, or a (num_shots, ceil(num_dets/8)) bit-packed array if packed is True.
+            packed (bool): True if the detection events are bit-packed (little endian bit order, as produced by Stim).
+
+        Returns:
+            np.ndarray: A (num_shots, numNodes) boolean array of syndromes in lattice order.
+        """
+        detectionEvents = np.atleast_2d(detectionEvents)
+
+        if packed:
+            detectionEvents = np.unpackbits(detectionEvents, axis=1, count=self.numDets, bitorder='little')
+
+        # An always-zero column is appended for the nodes with no detector
+        paddedEvents = np.zeros((detectionEvents.shape[0], self.numDets + 1), dtype=bool)
+        paddedEvents[:, :self.numDets] = detectionEvents
+
+        return paddedEvents[:, self.nodeToDet]
+
+    def observableMasks(self, dem: stim.DetectorErrorModel, edgeNodes: np.ndarray) -> np.ndarray:
+        """
+        Derives, from the error mechanisms of a detector error model, the logical observables
+        flipped by each edge of the uf_arch lattice.
+
+        Each (decomposed) error mechanism whose detectors are all mapped on the lattice is an
+        edge between two nodes, or between a node and the border: the edge takes the observables
+        of the most likely mechanism between its endpoints. Edges with no mechanism flip no observable.
+
+        Parameters:
+            dem (stim.DetectorErrorModel): The detector error model the mapping was built from.
+            edgeNodes (np.ndarray): The two endpoints of each lattice edge (see UnionFindDecoder.edge_nodes).
+
+        Returns:
+            np.ndarray: The uint64 observable mask of each edge (bit i for observable i).
+        """
+        endpointMasks = graphlikeErrors(dem, self.detToNode)
+
+        edgeNodes = np.asarray(edgeNodes, dtype=np.int64).reshape(-1, 2)
+        masks = np.zeros(len(edgeNodes), dtype=np.uint64)
+
+        for edge, (nodeA, nodeB) in enumerate(edgeNodes):
+            key = (min(nodeA, nodeB), max(nodeA, nodeB))
+
+            if key in endpointMasks:
+                masks[edge] = endpointMasks[key][1]
+
+        return masks
+
+def rotatedPermutation(distance: int) -> np.ndarray:
+    """
+    Returns, for each position in a round of unrolled Stim coordinates, its position
+    in the corresponding round of the uf_arch rotated lattice.
+    """
+    rowLen = (distance - 1) // 2
+    roundLen = (distance + 1) * rowLen
+    innerPeriod = 1 + rowLen
+
+    starterList = np.zeros(distance - 1, dtype=np.int64)
+    starterList[0::2] = (distance - 1) - np.arange(rowLen) - 1
+    starterList[1::2] = rowLen - np.arange(rowLen) - 1
+
+    positions = np.arange(roundLen)
+
+    return starterList[positions // innerPeriod] + positions % innerPeriod * (distance - 1)
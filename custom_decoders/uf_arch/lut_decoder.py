@@ -0,0 +1,289 @@
+import hashlib
+import itertools
+import pathlib
+import math
+
+import numpy as np
+import sinter
+import stim
+
+from custom_decoders.uf_arch.uf_arch_decoder import UFArchCompiledDecoder, UFArchParams
+from custom_decoders.triage import ShotTriage
+
+LUT_MAGIC = b"UFLUT\x00\x00\x01"
+LUT_HEADER_BYTES = 64
+
+# Multiplier and finalizer constants of the row hash (splitmix64)
+HASH_PRIME = np.uint64(0x9E3779B97F4A7C15)
+HASH_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+HASH_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+def hashRows(packedShots: np.ndarray) -> np.ndarray:
+    """
+    Hashes each bit-packed detection event row into 64 bits, in a single vectorized
+    pass over the 64-bit words of the rows.
+
+    Returns:
+        np.ndarray: The (num_shots,) uint64 hashes.
+    """
+    packedShots = np.atleast_2d(packedShots)
+    numWords = (packedShots.shape[1] + 7) // 8
+
+    padded = np.zeros((len(packedShots), numWords * 8), dtype=np.uint8)
+    padded[:, :packedShots.shape[1]] = packedShots
+    words = padded.view(np.uint64)
+
+    hashes = np.full(len(packedShots), packedShots.shape[1], dtype=np.uint64)
+
+    for i in range(numWords):
+        hashes = (hashes ^ words[:, i]) * HASH_PRIME
+        hashes ^= hashes >> np.uint64(30)
+        hashes *= HASH_MIX_1
+        hashes ^= hashes >> np.uint64(27)
+        hashes *= HASH_MIX_2
+        hashes ^= hashes >> np.uint64(31)
+
+    return hashes
+
+def demFingerprint(dem: stim.DetectorErrorModel) -> int:
+    """
+    A 64-bit fingerprint of the detector error model, so that a table is only used for
+    the model (code, rounds, noise) it was built for.
+    """
+    return int.from_bytes(hashlib.blake2b(str(dem).encode(), digest_size=8).digest(), "little")
+
+def tablePath(tableDir, dem: stim.DetectorErrorModel) -> pathlib.Path:
+    return pathlib.Path(tableDir) / f"{demFingerprint(dem):016x}.lut"
+
+def sampleSyndromes(circuit: stim.Circuit, shots: int, seed: int | None = None) -> np.ndarray:
+    return circuit.compile_detector_sampler(seed=seed).sample(shots, bit_packed=True)
+
+def enumerateSyndromes(numDetectors: int, maxWeight: int) -> np.ndarray:
+    """
+    Enumerates every syndrome with up to maxWeight detection events.
+
+    Returns:
+        np.ndarray: The (num_syndromes, ceil(numDetectors/8)) bit-packed syndromes.
+    """
+    numSyndromes = sum(math.comb(numDetectors, weight) for weight in range(maxWeight + 1))
+    unpacked = np.zeros((numSyndromes, numDetectors), dtype=np.uint8)
+
+    row = 1 # the first row is the syndrome without detection events
+    for weight in range(1, maxWeight + 1):
+        for dets in itertools.combinations(range(numDetectors), weight):
+            unpacked[row, list(dets)] = 1
+            row += 1
+
+    return np.packbits(unpacked, axis=1, bitorder='little')
+
+class LookupTable():
+    """
+    Syndrome -> prediction table of a detector error model, stored as sorted 64-bit row
+    hashes (see hashRows) and the bit-packed predictions of the same rows.
+
+    On disk, a 64-byte header (magic, number of entries, detectors, observables and the
+    fingerprint of the model) is followed by the hashes and then the predictions, so a
+    loaded table is memory-mapped and only the pages touched by the lookups are read.
+
+    Hashes shared by different syndromes are dropped when the table is built, so a
+    lookup never returns the prediction of another syndrome seen at build time.
+
+    Attributes
+    ----------
+    hashes : np.ndarray
+        The (num_entries,) sorted uint64 row hashes.
+    predictions : np.ndarray
+        The (num_entries, ceil(numObservables/8)) bit-packed predictions.
+    numDetectors, numObservables, fingerprint : int
+        The shape and the fingerprint (see demFingerprint) of the detector error model.
+    """
+    def __init__(self, hashes: np.ndarray, predictions: np.ndarray, numDetectors: int, numObservables: int, fingerprint: int):
+        self.hashes = hashes
+        self.predictions = predictions
+        self.numDetectors = numDetectors
+        self.numObservables = numObservables
+        self.fingerprint = fingerprint
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @classmethod
+    def build(cls, dem: stim.DetectorErrorModel, packedShots: np.ndarray, decodeRows):
+        """
+        Decodes the distinct syndromes of a batch offline and tabulates their predictions.
+
+        Parameters:
+            dem (stim.DetectorErrorModel): The detector error model of the syndromes.
+            packedShots (np.ndarray): The (num_shots, ceil(num_dets/8)) bit-packed syndromes, sampled or enumerated.
+            decodeRows (callable): Decodes a bit-packed batch of shots into its bit-packed predictions.
+        """
+        rows = np.unique(np.atleast_2d(packedShots), axis=0)
+        hashes = hashRows(rows)
+
+        order = np.argsort(hashes, kind='stable')
+        rows, hashes = rows[order], hashes[order]
+
+        # Distinct syndromes with the same hash are not tabulated (they are decoded on a miss)
+        collision = np.zeros(len(hashes), dtype=bool)
+        collision[1:] |= hashes[1:] == hashes[:-1]
+        collision[:-1] |= hashes[1:] == hashes[:-1]
+
+        rows, hashes = rows[~collision], hashes[~collision]
+        predictions = decodeRows(rows) if len(rows) else np.zeros((0, (dem.num_observables + 7) // 8), dtype=np.uint8)
+
+        return cls(hashes, np.ascontiguousarray(predictions, dtype=np.uint8), dem.num_detectors, dem.num_observables, demFingerprint(dem))
+
+    def save(self, path):
+        header = np.zeros(LUT_HEADER_BYTES, dtype=np.uint8)
+        header[:len(LUT_MAGIC)] = np.frombuffer(LUT_MAGIC, dtype=np.uint8)
+        header[8:40].view(np.uint64)[:] = [len(self), self.numDetectors, self.numObservables, self.fingerprint]
+
+        with open(path, "wb") as file:
+            file.write(header.tobytes())
+            file.write(np.ascontiguousarray(self.hashes, dtype=np.uint64).tobytes())
+            file.write(np.ascontiguousarray(self.predictions, dtype=np.uint8).tobytes())
+
+    @classmethod
+    def load(cls, path):
+        header = np.fromfile(path, dtype=np.uint8, count=LUT_HEADER_BYTES)
+
+        if header[:len(LUT_MAGIC)].tobytes() != LUT_MAGIC:
+            raise ValueError(f"{path} is not a lookup table file.")
+
+        numEntries, numDetectors, numObservables, fingerprint = (int(x) for x in header[8:40].view(np.uint64))
+        numObsBytes = (numObservables + 7) // 8
+
+        hashes = np.memmap(path, dtype=np.uint64, mode='r', offset=LUT_HEADER_BYTES, shape=(numEntries,)) if numEntries else np.zeros(0, dtype=np.uint64)
+        predictions = np.memmap(path, dtype=np.uint8, mode='r', offset=LUT_HEADER_BYTES + 8 * numEntries, shape=(numEntries, numObsBytes)) if numEntries else np.zeros((0, numObsBytes), dtype=np.uint8)
+
+        return cls(hashes, predictions, numDetectors, numObservables, fingerprint)
+
+    def lookup(self, packedShots: np.ndarray):
+        """
+        Looks up a batch of bit-packed shots, by binary search over the sorted hashes.
+
+        Returns:
+            tuple: The (num_shots,) mask of the shots found in the table, and their bit-packed predictions.
+        """
+        hashes = hashRows(packedShots)
+
+        if not len(self):
+            return np.zeros(len(hashes), dtype=bool), self.predictions
+
+        positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self) - 1)
+        found = self.hashes[positions] == hashes
+
+        return found, self.predictions[positions[found]]
+
+class UFArchLUTCompiledDecoder(sinter.CompiledDecoder):
+    """
+    A lookup-table decoder compiled for a detector error model: the shots whose syndrome is
+    in the table are predicted by a binary search, and the others fall back to the uf_arch
+    decoder (see UFArchCompiledDecoder). Without a table, every shot falls back.
+    """
+    def __init__(self, params: UFArchParams, dem: stim.DetectorErrorModel, table: LookupTable | None = None, triage: ShotTriage | None = None):
+        super().__init__()
+        self.numObservables = dem.num_observables
+        self.table = table
+        self.triage = triage if triage is not None else ShotTriage()
+
+        if table is not None and table.fingerprint != demFingerprint(dem):
+            raise ValueError("The lookup table was built for another detector error model.")
+
+        self.fallback = UFArchCompiledDecoder(params, dem, self.triage)
+
+        self.hits = 0
+        self.misses = 0
+
+    def decode_shots_bit_packed(self, *, bit_packed_detection_event_data: np.ndarray,) -> np.ndarray:
+        return self.triage.decode(bit_packed_detection_event_data, self.numObservables, self.decodeRows)
+
+    def decodeRows(self, bit_packed_detection_event_data: np.ndarray) -> np.ndarray:
+        if self.table is None:
+            self.misses += len(bit_packed_detection_event_data)
+            return self.fallback.decodeRows(bit_packed_detection_event_data)
+
+        found, tablePredictions = self.table.lookup(bit_packed_detection_event_data)
+
+        predictions = np.zeros((len(bit_packed_detection_event_data), (self.numObservables + 7) // 8), dtype=np.uint8)
+        predictions[found] = tablePredictions
+
+        missed = np.flatnonzero(~found)
+
+        self.hits += len(found) - len(missed)
+        self.misses += len(missed)
+
+        if len(missed):
+            predictions[missed] = self.fallback.decodeRows(bit_packed_detection_event_data[missed])
+
+        return predictions
+
+class UFArchLUTDecoder(sinter.Decoder):
+    """
+    Sinter decoder backed by the lookup tables of a directory (see tablePath and
+    build_lut.py), one per detector error model, with the uf_arch decoder as fallback.
+
+    The tables are memory-mapped when a decoder is compiled for their model; a model
+    without a table is decoded by the fallback only.
+    """
+    def __init__(self, tableDir, params: UFArchParams | None = None, **overrides):
+        super().__init__()
+        self.tableDir = pathlib.Path(tableDir)
+
+        if params is None:
+            params = UFArchParams.from_dict(overrides)
+        else:
+            for key, value in overrides.items():
+                if hasattr(params, key):
+                    setattr(params, key, value)
+
+        params.validate()
+        self.params = params
+
+        # Shared by the compiled decoders, to report the fraction of triaged shots
+        self.triage = ShotTriage()
+        # The compiled decoders, to report their table hits and misses
+        self.compiledDecoders = []
+
+    @property
+    def triagedFraction(self) -> float:
+        return self.triage.triagedFraction
+
+    @property
+    def tableHits(self) -> int:
+        return sum(decoder.hits for decoder in self.compiledDecoders)
+
+    @property
+    def tableMisses(self) -> int:
+        return sum(decoder.misses for decoder in self.compiledDecoders)
+
+    def compile_decoder_for_dem(self, *, dem: stim.DetectorErrorModel) -> 'sinter.CompiledDecoder':
+        path = tablePath(self.tableDir, dem)
+        table = LookupTable.load(path) if path.exists() else None
+
+        compiledDecoder = UFArchLUTCompiledDecoder(self.params, dem, table, self.triage)
+        self.compiledDecoders.append(compiledDecoder)
+
+        return compiledDecoder
+
+    def decode_via_files(self,
+                         *,
+                         num_shots: int,
+                         num_dets: int,
+                         num_obs: int,
+                         dem_path: pathlib.Path,
+                         dets_b8_in_path: pathlib.Path,
+                         obs_predictions_b8_out_path: pathlib.Path,
+                         tmp_dir: pathlib.Path,
+                       ) -> None:
+
+        compiledDecoder = self.compile_decoder_for_dem(dem=stim.DetectorErrorModel.from_file(dem_path))
+
+        packed_detection_event_data = np.fromfile(dets_b8_in_path, dtype=np.uint8)
+        packed_detection_event_data.shape = (num_shots, math.ceil(num_dets / 8))
+
+        # Make predictions
+        all_predictions = compiledDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=packed_detection_event_data)
+
+        # Write predictions.
+        all_predictions.tofile(obs_predictions_b8_out_path)
@@ -0,0 +1,121 @@
+import sinter
+import stim
+import numpy as np
+import pathlib
+import math
+
+import uf_arch.uf_arch as uf
+
+from custom_decoders.uf_arch.detector_mapping import DetectorMapping
+from custom_decoders.uf_arch.dem_graph import graphlikeErrors
+from custom_decoders.triage import ShotTriage
+
+class RepetitionMapping(DetectorMapping):
+    """
+    Precomputed mapping from Stim detector indices to the nodes of the uf_arch repetition
+    code grid (round * (distance - 1) + column), for the repetition_code:memory task.
+
+    Attributes
+    ----------
+    diagonalOffset : int
+        The column offset of the space-time diagonal edges of the DEM (-1, +1, or 0 if there are none).
+    """
+    def __init__(self, detToNode: np.ndarray, distance: int, rounds: int, diagonalOffset: int = 0):
+        super().__init__(detToNode, distance, rounds, numNodes=rounds * (distance - 1))
+        self.diagonalOffset = diagonalOffset
+
+    @classmethod
+    def from_dem(cls, dem: stim.DetectorErrorModel):
+        detCoords = dem.get_detector_coordinates()
+        coords = np.array([detCoords[i] for i in range(dem.num_detectors)], dtype=float)
+
+        # Detectors are placed between the data qubits, at odd x coordinates
+        cols = (coords[:, 0] - 1) // 2
+        rounds = coords[:, 1]
+
+        numCols = int(cols.max()) + 1
+        detToNode = (rounds * numCols + cols).astype(np.int32)
+
+        return cls(detToNode, numCols + 1, int(rounds.max()) + 1, repetitionDiagonalOffset(dem, detToNode, numCols))
+
+class UFArchRepetitionCompiledDecoder(sinter.CompiledDecoder):
+    """
+    The uf_arch repetition code decoder compiled for a detector error model: the grid,
+    its diagonal edges and the observables flipped by each edge are derived from the
+    detector error model once, and every batch is decoded in C++ (but for the shots
+    without detection events, predicted by the triage).
+    """
+    def __init__(self, dem: stim.DetectorErrorModel, triage: ShotTriage | None = None):
+        super().__init__()
+        self.mapping = RepetitionMapping.from_dem(dem)
+        self.numObservables = dem.num_observables
+        self.triage = triage if triage is not None else ShotTriage()
+
+        self.ufDecoder = uf.RepetitionDecoder(self.mapping.distance, self.mapping.rounds, self.mapping.diagonalOffset)
+        self.ufDecoder.set_observable_masks(self.mapping.observableMasks(dem, np.array(self.ufDecoder.edge_nodes)))
+
+    def decode_shots_bit_packed(self, *, bit_packed_detection_event_data: np.ndarray,) -> np.ndarray:
+        return self.triage.decode(
+            bit_packed_detection_event_data, self.numObservables,
+            lambda rows: self.ufDecoder.decode_batch(rows, self.mapping.detToNode, self.numObservables))
+
+class UFArchRepetitionDecoder(sinter.Decoder):
+    """
+    Sinter decoder for repetition_code:memory tasks, running the specialized uf_arch
+    repetition code decoder (see RepetitionDecoder in uf_arch/src/repetition_decoder.hpp).
+    """
+    def __init__(self):
+        super().__init__()
+
+        # Shared by the compiled decoders, to report the fraction of triaged shots
+        self.triage = ShotTriage()
+
+    @property
+    def triagedFraction(self) -> float:
+        return self.triage.triagedFraction
+
+    def compile_decoder_for_dem(self, *, dem: stim.DetectorErrorModel) -> 'sinter.CompiledDecoder':
+        return UFArchRepetitionCompiledDecoder(dem, self.triage)
+
+    def decode_via_files(self,
+                         *,
+                         num_shots: int,
+                         num_dets: int,
+                         num_obs: int,
+                         dem_path: pathlib.Path,
+                         dets_b8_in_path: pathlib.Path,
+                         obs_predictions_b8_out_path: pathlib.Path,
+                         tmp_dir: pathlib.Path,
+                       ) -> None:
+
+        compiledDecoder = self.compile_decoder_for_dem(dem=stim.DetectorErrorModel.from_file(dem_path))
+
+        packed_detection_event_data = np.fromfile(dets_b8_in_path, dtype=np.uint8)
+        packed_detection_event_data.shape = (num_shots, math.ceil(num_dets / 8))
+
+        # Make predictions
+        all_predictions = compiledDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=packed_detection_event_data)
+
+        # Write predictions.
+        all_predictions.tofile(obs_predictions_b8_out_path)
+
+def repetitionDiagonalOffset(dem: stim.DetectorErrorModel, detToNode: np.ndarray, numCols: int) -> int:
+    """
+    Returns the column offset (-1 or +1) of the most common space-time diagonal edge
+    of the detector error model, or 0 if it has no diagonal edges.
+    """
+    counts = {-1: 0, 1: 0}
+
+    for nodeA, nodeB in graphlikeErrors(dem, detToNode).keys():
+        if nodeA < 0 or nodeB // numCols - nodeA // numCols != 1:
+            continue
+
+        offset = nodeB % numCols - nodeA % numCols
+
+        if offset in counts:
+            counts[offset] += 1
+
+    if not any(counts.values()):
+        return 0
+
+    return max(counts, key=counts.get)
@@ -6,8 +6,15 @@ import math
 
 import uf_arch.uf_arch as uf
 
+from custom_decoders.uf_arch.detector_mapping import DetectorMapping
+from custom_decoders.uf_arch.dem_graph import DemGraph
+from custom_decoders.triage import ShotTriage
+
 from dataclasses import dataclass
 
+# Code types decoded on the hardcoded uf_arch rotated lattice, the others are decoded on the DEM graph
+LATTICE_CODE_TYPES = ("rotated", "surface_code:rotated_memory_z")
+
 @dataclass
 class UFArchParams:
     codeType: str
@@ -19,6 +26,29 @@ class UFArchParams:
     C_param: int = 1
     P_param: int = 1
 
+    # Number of software threads running the I/G partitions (0 = serial execution)
+    num_threads: int = 0
+    # If True, the merge stage uses the lock-free parallel merge (C_param partitions)
+    parallel_merge: bool = False
+    # If True, the clusters are peeled independently (C_param partitions, P_param leaves per step)
+    parallel_peeling: bool = False
+    # If True, the decoding graph is always built from the DEM, even for the rotated lattice
+    dem_graph: bool = False
+    # If True, batches are decoded 64 shots at a time by the (experimental) bit-sliced kernel
+    bit_sliced: bool = False
+    # Boundary fraction of the edges above which a shot switches to dense grow steps (negative = never).
+    # Dense mode merges in edge index order, less accurate at low error rates (d=5 p=0.005: 3388 -> 3700 errors in 1e5 shots)
+    dense_grow_threshold: float = -1.0
+    # If True, isolated defect pairs and border singletons are matched by the predecoder before union-find.
+    # Heuristic, not lossless: it raises the logical error rate slightly (d=5 p=0.005: 0.0371 -> 0.0380)
+    predecoder: bool = False
+    # Rounds of the sliding window (0 = the whole volume is decoded at once), and rounds committed per slide
+    window_rounds: int = 0
+    commit_rounds: int = 0
+    # There is no prediction cache (see PredictionCache) on this path: a lookup in Python costs
+    # more than decoding the shot in C++, so the cache only serves the qsurface adapter
+
+
     @classmethod
     def from_dict(cls, params_dict):
         return cls(
@@ -29,11 +59,111 @@ class UFArchParams:
             G_param=params_dict.get("G_param", 1),
             C_param=params_dict.get("C_param", 1),
             P_param=params_dict.get("P_param", 1),
+            num_threads=params_dict.get("num_threads", 0),
+            parallel_merge=params_dict.get("parallel_merge", False),
+            parallel_peeling=params_dict.get("parallel_peeling", False),
+            dem_graph=params_dict.get("dem_graph", False),
+            bit_sliced=params_dict.get("bit_sliced", False),
+            dense_grow_threshold=params_dict.get("dense_grow_threshold", -1.0),
+            predecoder=params_dict.get("predecoder", False),
+            window_rounds=params_dict.get("window_rounds", 0),
+            commit_rounds=params_dict.get("commit_rounds", 0),
         )
     
     def validate(self):
         if self.I_param <= 0 or self.G_param <= 0 or self.C_param <= 0 or self.P_param <= 0:
             raise ValueError("I_param, G_param, C_param, and P_param must be positive integers.")
+        if self.num_threads < 0:
+            raise ValueError("num_threads must be a non-negative integer.")
+        if self.window_rounds < 0 or (self.window_rounds and not 0 < self.commit_rounds < self.window_rounds):
+            raise ValueError("commit_rounds must be between 1 and window_rounds - 1 when a sliding window is used.")
+
+class UFArchCompiledDecoder(sinter.CompiledDecoder):
+    """
+    A uf_arch decoder compiled for a detector error model: the detector mapping and
+    the C++ decoder are built once, and every batch is decoded in memory on the same
+    (warm) decoder instance.
+
+    The observables flipped by each lattice edge are derived from the detector error
+    model, so the C++ decoder predicts every observable of the model by itself.
+
+    Rotated surface codes are decoded on the uf_arch rotated lattice; any other code (or
+    any code, if params.dem_graph is set) is decoded on the graph of the detector error model.
+
+    If params.window_rounds is set and shorter than the experiment, the rotated lattice is a
+    sliding window of window_rounds rounds over the rounds of each shot (see set_window).
+
+    Shots without detection events are predicted by the triage, without entering the decoder.
+    """
+    def __init__(self, params: UFArchParams, dem: stim.DetectorErrorModel, triage: ShotTriage | None = None):
+        super().__init__()
+        self.params = params
+        self.numObservables = dem.num_observables
+        self.triage = triage if triage is not None else ShotTriage()
+
+        if params.codeType in LATTICE_CODE_TYPES and not params.dem_graph:
+            self.mapping = DetectorMapping.from_dem(dem)
+            windowed = 0 < params.window_rounds < self.mapping.rounds
+
+            self.ufDecoder = uf.UnionFindDecoder(
+                self.mapping.distance, params.window_rounds if windowed else self.mapping.rounds, 
+                uf.CodeType.ROTATED, 
+                params.I_param, 
+                params.G_param, 
+                params.C_param, 
+                params.P_param, 
+                params.early_stopping_param, 
+                params.early_stopping_peeling_param
+            )
+
+            # The masks of the window edges come from the first rounds of the model, the same in every round
+            self.ufDecoder.set_observable_masks(self.mapping.observableMasks(dem, np.array(self.ufDecoder.edge_nodes)))
+
+            if windowed:
+                self.ufDecoder.set_window(params.commit_rounds, self.mapping.rounds)
+        else:
+            if params.window_rounds:
+                raise ValueError("Sliding windows are only supported on the rotated lattice.")
+
+            # The detectors are the nodes of the graph, so the graph doubles as the detector mapping
+            self.mapping = DemGraph.from_dem(dem)
+
+            self.ufDecoder = uf.UnionFindDecoder(
+                self.mapping.numNodes, self.mapping.edgeNodes,
+                params.I_param, 
+                params.G_param, 
+                params.C_param, 
+                params.P_param, 
+                params.early_stopping_param, 
+                params.early_stopping_peeling_param
+            )
+
+            self.ufDecoder.set_observable_masks(self.mapping.edgeObservables)
+
+        if params.num_threads > 0:
+            self.ufDecoder.set_threads(params.num_threads)
+
+        if params.parallel_merge:
+            self.ufDecoder.set_parallel_merge(True)
+
+        if params.parallel_peeling:
+            self.ufDecoder.set_parallel_peeling(True)
+
+        if params.bit_sliced:
+            self.ufDecoder.set_bit_sliced(True)
+
+        if params.dense_grow_threshold >= 0:
+            self.ufDecoder.set_dense_grow_threshold(params.dense_grow_threshold)
+
+        if params.predecoder:
+            self.ufDecoder.set_predecoder(True)
+
+    def decode_shots_bit_packed(self, *, bit_packed_detection_event_data: np.ndarray,) -> np.ndarray:
+        # The shots left by the triage are decoded in C++
+        return self.triage.decode(bit_packed_detection_event_data, self.numObservables, self.decodeRows)
+
+    def decodeRows(self, bit_packed_detection_event_data: np.ndarray) -> np.ndarray:
+        return self.ufDecoder.decode_batch(bit_packed_detection_event_data, self.mapping.detToNode, self.numObservables)
 
 class UFArchDecoder(sinter.Decoder):
     def __init__(self, params: UFArchParams | None = None, **overrides):
@@ -48,6 +178,16 @@ class UFArchDecoder(sinter.Decoder):
         params.validate()
         self.params = params
 
+        # Shared by the compiled decoders, to report the fraction of triaged shots
+        self.triage = ShotTriage()
+
+    @property
+    def triagedFraction(self) -> float:
+        return self.triage.triagedFraction
+
+    def compile_decoder_for_dem(self, *, dem: stim.DetectorErrorModel) -> 'sinter.CompiledDecoder':
+        return UFArchCompiledDecoder(self.params, dem, self.triage)
+
     def decode_via_files(self,
                          *,
                          num_shots: int,
@@ -59,115 +199,13 @@ class UFArchDecoder(sinter.Decoder):
                          tmp_dir: pathlib.Path,
                        ) -> None:
         
-        detCoords = stim.DetectorErrorModel.from_file(dem_path).get_detector_coordinates()
-        distance, rounds = getCodeParams(detCoords, self.params.codeType)
-
-        ufDecoder = uf.UnionFindDecoder(
-            distance, distance+1, 
-            uf.CodeType.ROTATED, 
-            self.params.I_param, 
-            self.params.G_param, 
-            self.params.C_param, 
-            self.params.P_param, 
-            self.params.early_stopping_param, 
-            self.params.early_stopping_peeling_param
-        )
+        compiledDecoder = self.compile_decoder_for_dem(dem=stim.DetectorErrorModel.from_file(dem_path))
 
         packed_detection_event_data = np.fromfile(dets_b8_in_path, dtype=np.uint8)
         packed_detection_event_data.shape = (num_shots, math.ceil(num_dets / 8))
 
-        # Make predictions.
-        all_predictions = []
-        for shot in packed_detection_event_data:
-            unpacked = np.unpackbits(shot, bitorder='little')
-            
-            # TODO: extract method
-            rowLen = (distance - 1) // 2
-            columnLen = (distance + 1)
-            roundLen = rowLen * columnLen
-
-            dbg_triggerd = []
-
-            input_sample = [0] * (roundLen * (distance + 1))
-            for i_bit, bit in enumerate(unpacked):
-                coords = detCoords[i_bit]
-                if bit and (coords[0] // 2) % 2 == (coords[1] // 2) % 2:
-                    dbg_triggerd.append(coords)
-                    unrolledCoords = coords[2] * roundLen + (coords[1] // 2 - 1) * columnLen // 2 + coords[0] // 4
-                    unrolledCoords = int(unrolledCoords)
-                    input_sample[unrolledCoords] = 1
-
-            input_sample = sample_fromStim(input_sample, distance)
-
-            try:
-                ufDecoder.decode(input_sample)
-                stats = ufDecoder.get_stats()
-                corrections = ufDecoder.get_horizontal_corrections()
-
-                # parity means counting the number of corrections with coordinate [1] == 0
-                parity = 0
-                for correction in corrections:
-                    if correction[2] == distance-1:
-                        parity ^= 1
-            except:
-                parity = 0
-
-            prediction = [parity]
-
-            all_predictions.append(prediction)
+        # Make predictions
+        all_predictions = compiledDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=packed_detection_event_data)
 
         # Write predictions.
-        np.packbits(all_predictions, axis=1, bitorder='little').tofile(obs_predictions_b8_out_path)
-
-def sample_fromStim(stimSample, distance):
-    columnLength = (distance - 1) // 2
-    period = (distance + 1) * columnLength
-
-    starter_list = [0] * (distance - 1)
-    for i in range((distance - 1) // 2):
-        starter_list[2*i] = (distance - 1) - i - 1
-    for i in range((distance - 1) // 2):
-        starter_list[2*i + 1] = (distance - 1) // 2 - i - 1
-
-    for i in range(len(stimSample) // period):
-        round = stimSample[i * period:(i + 1) * period]
-        #converted = [round[2], round[0], round[3], round[1]]
-        converted = [0] * period
-        for j in range(len(round)):
-            inner_period = 1 + (distance-1) // 2
-            inner_sum = j % inner_period * (distance - 1)
-            inner_offset = starter_list[j // inner_period]
-            conv_coord = inner_offset + inner_sum
-            converted[conv_coord] = round[j]
-        stimSample[i * period:(i + 1) * period] = converted
-
-    return stimSample
-
-def getCodeParams(detCoords: dict, codeType: str) -> dict:
-    distance = 0
-
-    if True or codeType == "rotated":
-        distance = getRotatedParams(detCoords)
-    elif codeType == "planar":
-        distance = getUnrotatedParams(detCoords)
-    elif codeType == "repetition":
-        distance = getRepetitionParams(detCoords)
-
-    rounds = int(list(detCoords.values())[-1][-1])
-
-    return distance, rounds
-
-def getRotatedParams(detCoords: dict) -> dict:
-    distance = int(list(detCoords.values())[-1][0] / 2) # the last coordinate is the one with the highest x value, so take it and halve it
-
-    return distance
-
-def getUnrotatedParams(detCoords: dict) -> dict:
-    distance = int(list(detCoords.values())[-1][0] / 2) + 1
-
-    return distance
-
-def getRepetitionParams(detCoords: dict) -> dict:
-    distance = int(list(detCoords.values())[-1][0]+1) // 2 + 1
-
-    return distance
+        all_predictions.tofile(obs_predictions_b8_out_path)
@@ -1,9 +1,13 @@
 import math
 import pathlib
+import time
 import numpy as np
 import sinter
 import stim
 
+from custom_decoders.triage import ShotTriage
+from custom_decoders.prediction_cache import PredictionCache
+
 CODE_TYPES = {
     "surface_code:unrotated_memory_z" : "planar", # these are qsurface names
     "surface_code:rotated_memory_z" : "rotated",
@@ -24,35 +28,81 @@ OBSERVABLE_DATA_POSITION = {
     "repetition" : -1
 }
 
+# The (x, z) states the data qubits start every shot from
+INITIAL_STATES = (0, 0)
+
 class UnionFindCompiledDecoder(sinter.CompiledDecoder):
-    def __init__(self, codeType : str, detector_error_model : stim.DetectorErrorModel):
+    def __init__(self, codeType : str, detector_error_model : stim.DetectorErrorModel, triage : ShotTriage = None, cache : PredictionCache = None):
         super().__init__()
         self.codeType = codeType
         self.dem = detector_error_model
+        self.triage = triage if triage is not None else ShotTriage()
+        self.cache = cache
 
         detCoords = detector_error_model.get_detector_coordinates()
         self.convCoords, self.distance, self.rounds = getCodeParams(detCoords, codeType)
 
+        # The qsurface lattice is built once per DEM, and reset before every shot (see reset_qsurface)
+        self.qsurface = initialize_qsurface(codeType, self.distance, self.rounds)
+
+        self.observableLookup = ObservableLookup(codeType, self.distance, self.qsurface[0])
+
     def decode_shots_bit_packed(self, *, bit_packed_detection_event_data: np.ndarray,) -> np.ndarray:
+        # Shots without detection events are predicted by the triage, without running qsurface
+        return self.triage.decode(bit_packed_detection_event_data, self.dem.num_observables, self.decodeCachedRows)
+
+    def decodeCachedRows(self, bit_packed_detection_event_data: np.ndarray) -> np.ndarray:
+        # Repeated syndromes are predicted from the cache, without running qsurface
+        if self.cache is None:
+            return self.decodeRows(bit_packed_detection_event_data)
+
+        return self.cache.decode(bit_packed_detection_event_data, self.dem.num_observables, self.decodeRows)
+
+    def decodeRows(self, bit_packed_detection_event_data: np.ndarray) -> np.ndarray:
         all_predictions = []
+
+        # The whole batch is unpacked at once
+        unpackedShots = np.unpackbits(bit_packed_detection_event_data, axis=1, count=len(self.convCoords), bitorder='little')
         
-        for shot in bit_packed_detection_event_data:
-            unpacked = np.unpackbits(shot, bitorder='little')
+        for unpacked in unpackedShots:
             prediction = predict_from_qsurface(
                 sample=unpacked, 
                 codeType=self.codeType, 
                 convCoords=self.convCoords, 
                 distance=self.distance,
-                rounds=self.rounds)
+                rounds=self.rounds,
+                qsurface=self.qsurface,
+                observableLookup=self.observableLookup)
             all_predictions.append(prediction)
 
         return np.packbits(all_predictions, axis=1, bitorder='little')
     
 class UnionFindDecoder(sinter.Decoder):
-    def __init__(self, codeType : str):
+    def __init__(self, codeType : str, cacheCapacity : int = 0, cacheEviction : str = "lru"):
         super().__init__()
         self.codeType = codeType
 
+        # Syndromes whose predictions are cached by each compiled decoder (0 = no cache)
+        self.cacheCapacity = cacheCapacity
+        self.cacheEviction = cacheEviction
+
+        # Shared by the compiled decoders, to report the fraction of triaged shots
+        self.triage = ShotTriage()
+        # The prediction caches of the compiled decoders, to report their hits and misses
+        self.caches = []
+
+    @property
+    def triagedFraction(self) -> float:
+        return self.triage.triagedFraction
+
+    @property
+    def cacheHits(self) -> int:
+        return sum(cache.hits for cache in self.caches)
+
+    @property
+    def cacheMisses(self) -> int:
+        return sum(cache.misses for cache in self.caches)
+
     def decode_via_files(self,
                          *,
                          num_shots: int,
@@ -64,52 +114,112 @@ class UnionFindDecoder(sinter.Decoder):
                          tmp_dir: pathlib.Path,
                        ) -> None:
 
-        detCoords = stim.DetectorErrorModel.from_file(dem_path).get_detector_coordinates()
-        convCoords, distance, rounds = getCodeParams(detCoords, self.codeType)
+        compiledDecoder = self.compile_decoder_for_dem(dem=stim.DetectorErrorModel.from_file(dem_path))
 
         packed_detection_event_data = np.fromfile(dets_b8_in_path, dtype=np.uint8)
         packed_detection_event_data.shape = (num_shots, math.ceil(num_dets / 8))
 
         # Make predictions.
-        all_predictions = []
-        for shot in packed_detection_event_data:
-            unpacked = np.unpackbits(shot, bitorder='little')
-            prediction = predict_from_qsurface(
-                sample=unpacked,
-                codeType=self.codeType,
-                convCoords=convCoords,
-                distance=distance,
-                rounds=rounds)
-            all_predictions.append(prediction)
+        all_predictions = compiledDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=packed_detection_event_data)
 
         # Write predictions.
-        np.packbits(all_predictions, axis=1, bitorder='little').tofile(obs_predictions_b8_out_path)
+        all_predictions.tofile(obs_predictions_b8_out_path)
 
     def compile_decoder_for_dem(self, *, dem: stim.DetectorErrorModel) -> 'sinter.CompiledDecoder':
-        return UnionFindCompiledDecoder(self.codeType, dem)
+        cache = None
+
+        # The predictions only hold for this DEM, so each compiled decoder gets its own cache
+        if self.cacheCapacity:
+            cache = PredictionCache(self.cacheCapacity, self.cacheEviction)
+            self.caches.append(cache)
+
+        return UnionFindCompiledDecoder(self.codeType, dem, self.triage, cache)
 
-def predict_from_qsurface(sample: np.ndarray, codeType : str, convCoords : dict, distance: int, rounds: int) -> np.ndarray:
+def import_qsurface_main():
     try:
-        from qsurface.main import initialize, run
+        import qsurface.main
     except Exception as e:
-        if e is ImportError:
+        if isinstance(e, ImportError):
             raise ImportError("You need to install the qsurface package to use this decoder.") 
         else:
             raise e
 
-    # Initialize params for qsurface
+    return qsurface.main
+
+def initialize_qsurface(codeType : str, distance: int, rounds: int):
+    """
+    Builds the qsurface code and union-find decoder objects for the given code.
+
+    The objects are stateful: the corrections of a run are applied to the data qubits of
+    the code, so a pair must be reset (see reset_qsurface) before it decodes the next shot.
+    """
+    qsurfaceMain = import_qsurface_main()
+
     size = (distance, distance, rounds+1) # last round is to check final clifford errors
+
+    return qsurfaceMain.initialize(size, CODE_TYPES[codeType], "unionfind", enabled_errors=["pauli"], plotting=False, faulty_measurements=True, initial_states=INITIAL_STATES)
+
+def reset_qsurface(code, decoder):
+    """
+    Brings a code and decoder pair built by initialize_qsurface back to its freshly built state.
+
+    The faulty measurements code carries the data qubit states (and so the corrections of the
+    previous shot) over from its last layer, so every edge goes back to its initial state and
+    every ancilla forgets its measurements. The clusters and peeling marks left on the ancillas
+    are only valid within the code instance they were made in, so a new instance drops them.
+    """
+    for layer in code.data_qubits.values():
+        for data in layer.values():
+            data._reinitialize(initial_states=INITIAL_STATES)
+
+    for layer in [*code.ancilla_qubits.values(), *code.pseudo_qubits.values()]:
+        for ancilla in layer.values():
+            ancilla.measured_state = ancilla.syndrome = ancilla.measurement_error = False
+
+            # Vertical edges between the rounds
+            for edge in ancilla.z_neighbors.values():
+                edge.state = False
+
+    if hasattr(code, "prev_logical_state"):
+        del code.prev_logical_state
+    code.no_error = True
+    code.instance = time.time()
+
+    decoder.buckets.clear()
+    decoder.bucket_max_filled = 0
+    decoder.clusters = []
+    decoder.cluster_index = 0
+    decoder.support = {edge: 0 for edge in decoder.support}
+
+def predict_from_qsurface(sample: np.ndarray, codeType : str, convCoords : dict, distance: int, rounds: int, qsurface=None, observableLookup=None) -> np.ndarray:
+    """
+    Predicts the observable flips of a shot with the qsurface union-find decoder.
+
+    Parameters:
+        qsurface (tuple): A (code, decoder) pair from initialize_qsurface, reset and reused for this
+            shot. A fresh pair is built when None.
+    """
+    qsurfaceMain = import_qsurface_main()
+
+    if qsurface is None:
+        code, decoder = initialize_qsurface(codeType, distance, rounds)
+    else:
+        code, decoder = qsurface
+        reset_qsurface(code, decoder)
+
     error_dict_for_qsurface = getqSurfaceErrorDict(sample, convCoords)
 
     # Run decoder with params
-    code, decoder = initialize(size, CODE_TYPES[codeType], "unionfind", enabled_errors=["pauli"], plotting=False, faulty_measurements=True, initial_states=(0,0))
-    output = run(code, decoder, error_rates = {"p_bitflip": 0, "p_phaseflip": 0}, decode_initial=False, custom_error_dict=error_dict_for_qsurface)
+    output = qsurfaceMain.run(code, decoder, error_rates = {"p_bitflip": 0, "p_phaseflip": 0}, decode_initial=False, custom_error_dict=error_dict_for_qsurface)
 
     # Get output matchings
     matchings = output["matchings"]
 
     # Get observable parity
-    obsParity = getObservableParity(codeType, matchings, distance)
+    if observableLookup is not None:
+        obsParity = observableLookup.parity(matchings)
+    else:
+        obsParity = getObservableParity(codeType, matchings, distance)
 
     return obsParity
 
@@ -147,40 +257,70 @@ def getRepetitionParams(detCoords: dict) -> dict:
     return convCoords, distance
 
 def getqSurfaceErrorDict(sample : np.ndarray, convCoords : dict) -> dict:
-    error_dict_for_qsurface = {}
-    for i, err in enumerate(sample):
-        if err == 1:
-            error_dict_for_qsurface[convCoords[i]] = err
+    # Only the detectors that fired are visited (padding bits past the last detector are ignored)
+    firedDets = np.flatnonzero(sample[:len(convCoords)])
 
-    return error_dict_for_qsurface
+    return {convCoords[i]: sample[i] for i in firedDets}
+
+class ObservableLookup():
+    """
+    Flags, for each edge of a qsurface lattice, whether it crosses the logical observable.
+
+    The flags are keyed by edge object, so they only hold for the code they were built from:
+    the lattice is reused across shots (see reset_qsurface), so the parsing of the edge names
+    (see edgeCrossesObservable) is done once per edge, when the lookup is built.
+    """
+    def __init__(self, codeType : str, distance : int, code):
+        self.codeType = codeType
+        self.distance = distance
+        self.flags = {}
+
+        for layer in code.data_qubits.values():
+            for data in layer.values():
+                for edge in data.edges.values():
+                    self.flags[edge] = edgeCrossesObservable(codeType, edge, distance)
+
+        # Vertical edges between the rounds
+        for layer in [*code.ancilla_qubits.values(), *code.pseudo_qubits.values()]:
+            for ancilla in layer.values():
+                for edge in ancilla.z_neighbors.values():
+                    self.flags[edge] = edgeCrossesObservable(codeType, edge, distance)
+
+    def parity(self, matchings : list) -> list:
+        tmpParity = 0
+
+        for m in matchings:
+            tmpParity ^= self.flags[m[0]]
+
+        return [tmpParity]
+
+# TODO: the observable exact coordinates should be taken from DEM (someway)
+def edgeCrossesObservable(codeType : str, edge, distance : int) -> int:
+    edgeName = str(edge)
+    prefix = "ez-" if CODE_TYPES[codeType] == "planar" else "ex-"
+
+    if prefix not in edgeName:
+        return 0
+
+    coords = edgeName.removeprefix(prefix).split('|')[0]
+    x, y = float(coords.split(',')[0][1:]), float(coords.split(',')[1][:-1])
 
-# TODO: this is correct but could be optimized. Also, the observable exact coordinates should be taken from DEM (someway)
-def getObservableParity(codeType : str, matchings : list, distance : int) -> np.ndarray:
     if CODE_TYPES[codeType] == "rotated":
-        matchings = [str(m[0]).removeprefix("ex-").split('|')[0] for m in matchings if "ex-" in str(m[0])]
-        matchings = [(float(m.split(',')[0][1:]), float(m.split(',')[1][:-1])) for m in matchings]
-        matchings = [(int((m[0] + 0.5) * 2), int((m[1] + 0.5) * 2)) for m in matchings]
+        x, y = int((x + 0.5) * 2), int((y + 0.5) * 2)
     elif CODE_TYPES[codeType] == "planar":
-        matchings = [str(m[0]).removeprefix("ez-").split('|')[0] for m in matchings if "ez-" in str(m[0])]
-        matchings = [(float(m.split(',')[0][1:]), float(m.split(',')[1][:-1])) for m in matchings]
-        matchings = [(int((m[0] - 0.5) * 2), int(m[1] * 2)) for m in matchings]
+        x, y = int((x - 0.5) * 2), int(y * 2)
     elif CODE_TYPES[codeType] == "repetition":
-        matchings = [str(m[0]).removeprefix("ex-").split('|')[0] for m in matchings if "ex-" in str(m[0])]
-        matchings = [(float(m.split(',')[0][1:]), float(m.split(',')[1][:-1])) for m in matchings]
-        matchings = [(int(m[0] * 2), 0) for m in matchings]
-
-    tmpParity = 0
+        return 1 if int(x * 2) == (distance-1)*2 else 0
 
     obsYCoord = OBSERVABLE_Y_COORD[CODE_TYPES[codeType]]
     obsDataPos = OBSERVABLE_DATA_POSITION[CODE_TYPES[codeType]]
 
-    if not CODE_TYPES[codeType] == "repetition":
-        for m in matchings:
-            if m[1] == obsYCoord and m[0] % 2 == obsDataPos:
-                tmpParity ^= 1
-    else:
-        for m in matchings:
-            if m[0] == (distance-1)*2:
-                tmpParity ^= 1
+    return 1 if y == obsYCoord and x % 2 == obsDataPos else 0
+
+def getObservableParity(codeType : str, matchings : list, distance : int) -> np.ndarray:
+    tmpParity = 0
+
+    for m in matchings:
+        tmpParity ^= edgeCrossesObservable(codeType, m[0], distance)
 
     return [tmpParity]
\ No newline at end of file
@@ -10,6 +10,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 from error_models import SuperconductiveEM
+from custom_decoders.uf_arch.detector_mapping import DetectorMapping
 
 SHOTS = 1000
 
@@ -25,51 +26,6 @@ ERROR_RATE_RANGE = np.linspace(MIN_ERROR_RATE, MAX_ERROR_RATE, ERROR_RATE_STEP)
 RESULTS_DIR = "results"
 RESULTS_PATH = f"{RESULTS_DIR}/dse_experiment_results.csv"
 
-def fromStim(stimSample, dem, distance):
-    rowLen = (distance - 1) // 2
-    columnLen = (distance + 1)
-    roundLen = rowLen * columnLen
-
-    detCoords = dem.get_detector_coordinates()
-
-    input_sample = [0] * (roundLen * (distance + 1))
-    for i_bit, bit in enumerate(stimSample):
-        coords = detCoords[i_bit]
-        if bit and (coords[0] // 2) % 2 == (coords[1] // 2) % 2:
-            unrolledCoords = coords[2] * roundLen + (coords[1] // 2 - 1) * columnLen // 2 + coords[0] // 4
-            unrolledCoords = int(unrolledCoords)
-            input_sample[unrolledCoords] = 1
-
-    input_sample = rotate_fromStim(input_sample, distance)
-
-    return input_sample
-
-def rotate_fromStim(stimSample, distance):
-    """
-    This function takes an ordered syndrome and converts it to a rotated ordered syndrome.
-    """
-    columnLength = (distance - 1) // 2
-    period = (distance + 1) * columnLength
-
-    starter_list = [0] * (distance - 1)
-    for i in range((distance - 1) // 2):
-        starter_list[2*i] = (distance - 1) - i - 1
-    for i in range((distance - 1) // 2):
-        starter_list[2*i + 1] = (distance - 1) // 2 - i - 1
-
-    for i in range(len(stimSample) // period):
-        round = stimSample[i * period:(i + 1) * period]
-        converted = [0] * period
-        for j in range(len(round)):
-            inner_period = 1 + (distance-1) // 2
-            inner_sum = j % inner_period * (distance - 1)
-            inner_offset = starter_list[j // inner_period]
-            conv_coord = inner_offset + inner_sum
-            converted[conv_coord] = round[j]
-        stimSample[i * period:(i + 1) * period] = converted
-
-    return stimSample
-
 def execExperiment():
     experimentFrame = pd.DataFrame(columns=["repetition", "distance", "base_error_rate", "num_grow_merge_iters", "boundaries_per_iter", "odd_clusters_per_iter", "merges_per_iter", "num_peeling_iters"])
 
@@ -97,12 +53,11 @@ def execExperiment():
             samples, observables = sampler.sample(shots=SHOTS, separate_observables=True)
 
             dem = rotatedCode.detector_error_model()
+            mapping = DetectorMapping.from_dem(dem)
 
-            for k, sample in enumerate(tqdm(samples)):
-                sample = list(sample)
-
-                input_sample = fromStim(sample, dem, distance)
+            inputSamples = mapping.apply(samples)
 
+            for k, input_sample in enumerate(tqdm(inputSamples)):
                 ufDecoder.decode(input_sample)
                 stats = ufDecoder.get_stats()
                 corrections = ufDecoder.get_horizontal_corrections()
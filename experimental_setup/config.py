@@ -9,6 +9,7 @@ ROTATED_SURFACE_CODE = "rotated"
 SPARSE_BLOSSOM_DECODER = "sparse_blossom"
 UNION_FIND_DECODER = "union_find"
 UF_ARCH_DECODER = "uf_arch"
+UF_ARCH_REPETITION_DECODER = "uf_arch_repetition"
 
 # === Subject: Noise Models ===
 SI1000_NOISE_MODEL = "si1000"
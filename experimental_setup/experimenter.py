@@ -5,6 +5,7 @@ import pandas as pd
 from experimental_setup import config
 from custom_decoders.unionfind.union_find_decoder import UnionFindDecoder
 from custom_decoders.uf_arch.uf_arch_decoder import UFArchDecoder, UFArchParams
+from custom_decoders.uf_arch.repetition_decoder import UFArchRepetitionDecoder
 from error_models import ErrorModel, SuperconductiveEM, WillowEM
 
 noiseModelDict = {
@@ -21,7 +22,8 @@ codeTypeDict = {
 decoderDict = {
     "sparse_blossom": "pymatching",
     "union_find": "union_find",
-    "uf_arch": "uf_arch"
+    "uf_arch": "uf_arch",
+    "uf_arch_repetition": "uf_arch_repetition"
 }
 
 CORES = 16
@@ -57,7 +59,8 @@ class Experimenter():
             for rounds in roundsList:
                 customDecodersDict = {
                     config.UNION_FIND_DECODER: UnionFindDecoder(codeType), 
-                    config.UF_ARCH_DECODER: UFArchDecoder(params=params)
+                    config.UF_ARCH_DECODER: UFArchDecoder(params=params),
+                    config.UF_ARCH_REPETITION_DECODER: UFArchRepetitionDecoder()
                 }
 
                 rounds = int(rounds)
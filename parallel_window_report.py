@@ -0,0 +1,96 @@
+import os
+import time
+import numpy as np
+import stim
+
+import uf_arch.uf_arch as uf
+
+from custom_decoders.uf_arch.detector_mapping import DetectorMapping
+from error_models.superconductive_em import SuperconductiveEM
+
+# Long memory experiments (see FACTORS in experimental_setup/config.py)
+DISTANCES = [11, 23]
+ROUNDS = [25, 100]
+ERROR_RATE = 0.003
+SHOTS = 2000
+
+# Commit regions and buffers, in units of the distance
+COMMIT_FACTOR = 1
+BUFFER_FACTOR = 1
+
+THREADS = os.cpu_count()
+
+REPORT_PATH = "./experimental_setup/results/parallel_window_report.txt"
+
+def decodeTimed(decoder, detectionEvents, mapping, observables):
+    """
+    Decodes a batch of shots, one after another.
+
+    Returns:
+        tuple: The mean latency per shot (in seconds) and the number of logical errors.
+    """
+    start = time.perf_counter()
+    predictions = decoder.decode_batch(detectionEvents, mapping.detToNode)
+    elapsed = time.perf_counter() - start
+
+    errors = int(np.count_nonzero(predictions[:, 0] & 1 != observables[:, 0]))
+
+    return elapsed / len(detectionEvents), errors
+
+def windowReport(distance, rounds, errorRate=ERROR_RATE, shots=SHOTS, threads=THREADS):
+    """
+    Compares the per-shot latency and the logical errors of the parallel window decoder
+    with the ones of the decoder of the whole space-time volume, on the same shots.
+    """
+    circuit = stim.Circuit.generated("surface_code:rotated_memory_z", rounds=rounds, distance=distance, **SuperconductiveEM(errorRate).toStim())
+    dem = circuit.detector_error_model()
+    mapping = DetectorMapping.from_dem(dem)
+
+    detectionEvents, observables = circuit.compile_detector_sampler().sample(shots, separate_observables=True, bit_packed=True)
+
+    fullDecoder = uf.UnionFindDecoder(distance, mapping.rounds, uf.CodeType.ROTATED)
+    masks = mapping.observableMasks(dem, np.array(fullDecoder.edge_nodes))
+    fullDecoder.set_observable_masks(masks)
+
+    commitRounds = COMMIT_FACTOR * distance
+    bufferRounds = BUFFER_FACTOR * distance
+
+    windowDecoder = uf.ParallelWindowDecoder(distance, mapping.rounds, commitRounds, bufferRounds, threads)
+    windowDecoder.set_observable_masks(masks)
+
+    fullLatency, fullErrors = decodeTimed(fullDecoder, detectionEvents, mapping, observables)
+    windowLatency, windowErrors = decodeTimed(windowDecoder, detectionEvents, mapping, observables)
+
+    return {
+        "d": distance,
+        "r": mapping.rounds,
+        "p": errorRate,
+        "shots": shots,
+        "threads": threads,
+        "windows": len(windowDecoder.get_windows()),
+        "commit_rounds": commitRounds,
+        "buffer_rounds": bufferRounds,
+        "full_latency_us": fullLatency * 1e6,
+        "window_latency_us": windowLatency * 1e6,
+        "speedup": fullLatency / windowLatency,
+        "full_errors": fullErrors,
+        "window_errors": windowErrors,
+        "error_overhead": windowErrors / fullErrors if fullErrors else float("nan"),
+    }
+
+if __name__ == "__main__":
+    report = []
+
+    for distance in DISTANCES:
+        for rounds in ROUNDS:
+            row = windowReport(distance, rounds)
+            report.append(row)
+
+            print(f"d={row['d']} r={row['r']}: {row['windows']} windows (commit {row['commit_rounds']}, buffer {row['buffer_rounds']}), "
+                  f"{row['full_latency_us']:.1f} -> {row['window_latency_us']:.1f} us/shot (x{row['speedup']:.2f}), "
+                  f"errors {row['full_errors']} -> {row['window_errors']} (x{row['error_overhead']:.2f})")
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+
+    with open(REPORT_PATH, "w") as file:
+        file.write(str(report).replace('},', '},\n'))
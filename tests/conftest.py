@@ -0,0 +1,71 @@
+import sys
+import pathlib
+
+import numpy as np
+import pytest
+import stim
+
+# The tests import the project modules (and the uf_arch bindings) from the repository root
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from custom_decoders.uf_arch.detector_mapping import DetectorMapping
+from error_models.superconductive_em import SuperconductiveEM
+
+@pytest.fixture(scope="session")
+def uf():
+    # The bindings are built by "make binds" in uf_arch/
+    return pytest.importorskip("uf_arch.uf_arch")
+
+class RotatedMemory():
+    """
+    Fixed-seed shots of a rotated memory_z experiment, with the detector mapping and the
+    observable masks needed to decode them on the uf_arch lattice.
+    """
+    def __init__(self, distance, errorRate, shots, rounds=None, seed=7):
+        self.circuit = stim.Circuit.generated("surface_code:rotated_memory_z", rounds=rounds or distance, distance=distance, **SuperconductiveEM(errorRate).toStim())
+        self.dem = self.circuit.detector_error_model()
+        self.mapping = DetectorMapping.from_dem(self.dem)
+        self.detectionEvents, self.observables = self.circuit.compile_detector_sampler(seed=seed).sample(shots, separate_observables=True, bit_packed=True)
+
+    def decoder(self, uf, *args, rounds=None):
+        decoder = uf.UnionFindDecoder(self.mapping.distance, rounds or self.mapping.rounds, uf.CodeType.ROTATED, *args)
+        decoder.set_observable_masks(self.mapping.observableMasks(self.dem, np.array(decoder.edge_nodes)))
+        return decoder
+
+    def baselineSample(self, shot):
+        # The per-shot conversion of the original adapter: a walk over the detector
+        # coordinates, then the reordering of each round to the lattice rows
+        distance = self.mapping.distance
+        rowLen = (distance - 1) // 2
+        roundLen = rowLen * (distance + 1)
+
+        detCoords = self.dem.get_detector_coordinates()
+        unpacked = np.unpackbits(self.detectionEvents[shot], count=self.dem.num_detectors, bitorder='little')
+
+        stimSample = [0] * (roundLen * self.mapping.rounds)
+        for i, bit in enumerate(unpacked):
+            coords = detCoords[i]
+            if bit and (coords[0] // 2) % 2 == (coords[1] // 2) % 2:
+                stimSample[int(coords[2] * roundLen + (coords[1] // 2 - 1) * (distance + 1) // 2 + coords[0] // 4)] = 1
+
+        starterList = [0] * (distance - 1)
+        for i in range(rowLen):
+            starterList[2*i] = (distance - 1) - i - 1
+            starterList[2*i + 1] = rowLen - i - 1
+
+        sample = [0] * len(stimSample)
+        for i in range(0, len(stimSample), roundLen):
+            for j in range(roundLen):
+                sample[i + starterList[j // (rowLen + 1)] + j % (rowLen + 1) * (distance - 1)] = stimSample[i + j]
+
+        return sample
+
+    def defects(self, shot):
+        dets = np.flatnonzero(np.unpackbits(self.detectionEvents[shot], count=self.dem.num_detectors, bitorder='little'))
+        nodes = self.mapping.detToNode[dets]
+        return sorted(int(node) for node in nodes[nodes >= 0])
+
+@pytest.fixture(scope="session")
+def rotatedMemory():
+    return RotatedMemory
@@ -0,0 +1,40 @@
+import pathlib
+
+import numpy as np
+import pytest
+
+# The adapter imports the uf_arch bindings, built by "make binds" in uf_arch/
+pytest.importorskip("uf_arch.uf_arch")
+
+from custom_decoders.uf_arch.uf_arch_decoder import UFArchCompiledDecoder, UFArchParams
+
+# Detection events of rotated memory_z shots (seed 11), and the predictions of the original
+# decoder (per-shot decode, then the parity of the horizontal corrections on the last column)
+REFERENCE = pathlib.Path(__file__).parent / "data" / "baseline_predictions.npz"
+
+@pytest.fixture(scope="module")
+def reference():
+    return np.load(REFERENCE)
+
+@pytest.mark.parametrize("name, distance, errorRate", [("d5", 5, 0.005), ("d7", 7, 0.008)])
+@pytest.mark.parametrize("threads", [0, 2])
+def test_default_decoder_matches_original_decoder(uf, rotatedMemory, reference, name, distance, errorRate, threads):
+    memory = rotatedMemory(distance, errorRate, 1)
+    detectionEvents = reference[f"{name}_detection_events"]
+
+    assert detectionEvents.shape[1] == (memory.dem.num_detectors + 7) // 8
+
+    decoder = memory.decoder(uf)
+    decoder.set_threads(threads)
+
+    predictions = decoder.decode_batch(detectionEvents, memory.mapping.detToNode)
+
+    np.testing.assert_array_equal(predictions[:, 0], reference[f"{name}_predictions"])
+
+def test_compiled_decoder_matches_original_decoder(uf, rotatedMemory, reference):
+    memory = rotatedMemory(5, 0.005, 1)
+
+    compiledDecoder = UFArchCompiledDecoder(UFArchParams(codeType="rotated"), memory.dem)
+    predictions = compiledDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=reference["d5_detection_events"])
+
+    np.testing.assert_array_equal(predictions[:, 0], reference["d5_predictions"])
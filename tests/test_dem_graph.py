@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import stim
+
+from custom_decoders.uf_arch.dem_graph import BORDER_NODE, DemGraph, graphlikeErrors
+
+DEM = stim.DetectorErrorModel("""
+    error(0.1) D0 D1
+    error(0.2) D1 D0 L0
+    error(0.05) D2 L1
+    error(0.3) D0 D1 D2
+    error(0.01) D2 ^ D3 D4 L0
+    error(0.02) D5 L0 L1
+    detector D6
+""")
+
+def test_graphlike_errors():
+    endpointMasks = graphlikeErrors(DEM, np.arange(DEM.num_detectors))
+
+    assert endpointMasks == {
+        # The most likely mechanism between two endpoints wins, whatever the detector order
+        (0, 1): (0.2, 0b01),
+        (BORDER_NODE, 2): (0.05, 0b10),
+        # Each component of a decomposed mechanism is an edge, with its own observables
+        (3, 4): (0.01, 0b01),
+        (BORDER_NODE, 5): (0.02, 0b11),
+    }
+
+def test_filtered_detectors_have_no_edge():
+    # Detectors 1 and 5 are filtered out, and the others are renamed
+    endpointMasks = graphlikeErrors(DEM, np.array([4, -1, 2, 1, 0, -1, 3]))
+
+    assert endpointMasks == {
+        (BORDER_NODE, 2): (0.05, 0b10),
+        (0, 1): (0.01, 0b01),
+    }
+
+def test_too_many_observables_are_rejected():
+    with pytest.raises(ValueError):
+        graphlikeErrors(stim.DetectorErrorModel("error(0.1) D0 L64"), np.arange(1))
+
+def test_dem_graph():
+    graph = DemGraph.from_dem(DEM)
+
+    assert graph.numNodes == 7
+    np.testing.assert_array_equal(graph.detToNode, np.arange(7))
+    np.testing.assert_array_equal(graph.edgeNodes, [[0, 1], [BORDER_NODE, 2], [3, 4], [BORDER_NODE, 5]])
+    np.testing.assert_array_equal(graph.edgeObservables, [0b01, 0b10, 0b01, 0b11])
+
+    assert graph.edgeNodes.dtype == np.int32
+    assert graph.edgeObservables.dtype == np.uint64
+
+def test_dem_graph_decodes_rotated_memory(uf, rotatedMemory):
+    # The graph of the decomposed model predicts as accurately as the rotated lattice
+    memory = rotatedMemory(5, 0.01, 1000)
+    dem = memory.circuit.detector_error_model(decompose_errors=True)
+    graph = DemGraph.from_dem(dem)
+
+    decoder = uf.UnionFindDecoder(graph.numNodes, graph.edgeNodes)
+    decoder.set_observable_masks(graph.edgeObservables)
+
+    graphErrors = np.count_nonzero(decoder.decode_batch(memory.detectionEvents, graph.detToNode)[:, 0] != memory.observables[:, 0])
+    latticeErrors = np.count_nonzero(memory.decoder(uf).decode_batch(memory.detectionEvents, memory.mapping.detToNode)[:, 0] != memory.observables[:, 0])
+
+    assert graphErrors <= latticeErrors + max(10, latticeErrors // 10)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from custom_decoders.uf_arch.detector_mapping import DetectorMapping
+
+@pytest.fixture(scope="module", params=[3, 5, 7])
+def memory(request, rotatedMemory):
+    return rotatedMemory(request.param, 0.02, 200)
+
+def test_code_parameters(memory):
+    distance = memory.mapping.distance
+
+    assert memory.mapping.rounds == distance + 1
+    assert memory.mapping.numNodes == (distance + 1) * (distance + 1) * ((distance - 1) // 2)
+    assert memory.mapping.numDets == memory.dem.num_detectors
+
+def test_z_stabilizers_map_to_distinct_nodes(memory):
+    detToNode = memory.mapping.detToNode
+    mapped = detToNode[detToNode >= 0]
+
+    # Every lattice node holds exactly one Z stabilizer detector
+    assert len(np.unique(mapped)) == len(mapped) == memory.mapping.numNodes
+
+    detCoords = memory.dem.get_detector_coordinates()
+    for det, node in enumerate(detToNode):
+        x, y = detCoords[det][:2]
+        assert (node >= 0) == ((x // 2) % 2 == (y // 2) % 2)
+
+        if node >= 0:
+            assert memory.mapping.nodeToDet[node] == det
+
+def test_apply_matches_per_shot_conversion(memory):
+    unpacked = np.unpackbits(memory.detectionEvents, axis=1, count=memory.dem.num_detectors, bitorder='little')
+
+    syndromes = memory.mapping.apply(memory.detectionEvents, packed=True)
+
+    assert syndromes.shape == (len(unpacked), memory.mapping.numNodes)
+    np.testing.assert_array_equal(syndromes, memory.mapping.apply(unpacked.astype(bool)))
+
+    for shot in range(len(unpacked)):
+        np.testing.assert_array_equal(syndromes[shot], memory.baselineSample(shot))
+
+def test_nodes_without_detectors_stay_clear():
+    # Detector 1 is filtered out, nodes 1 and 3 have no detector
+    mapping = DetectorMapping(np.array([2, -1, 0]), distance=3, rounds=1)
+
+    np.testing.assert_array_equal(mapping.nodeToDet, [2, 3, 0, 3])
+    np.testing.assert_array_equal(mapping.apply(np.array([[1, 1, 1], [0, 1, 0]], dtype=bool)), [[True, False, True, False], [False, False, False, False]])
+    np.testing.assert_array_equal(mapping.apply(np.array([[0b011]], dtype=np.uint8), packed=True), [[False, False, True, False]])
@@ -0,0 +1,22 @@
+import pytest
+from custom_decoders.uf_arch.dem_graph import BORDER_NODE
+
+def test_graph_without_border_is_rejected(uf):
+    # An odd number of defects in this graph could never be matched
+    with pytest.raises(ValueError, match="without edges to the border"):
+        uf.UnionFindDecoder(3, [[0, 1], [1, 2]])
+
+def test_component_without_border_is_rejected(uf):
+    # Nodes 0-1 reach the border, nodes 2-3 do not
+    with pytest.raises(ValueError):
+        uf.UnionFindDecoder(4, [[0, 1], [1, BORDER_NODE], [2, 3]])
+
+def test_graph_with_border_decodes(uf):
+    decoder = uf.UnionFindDecoder(3, [[BORDER_NODE, 0], [0, 1], [1, 2], [2, BORDER_NODE]])
+    decoder.set_observable_masks([1, 0, 0, 0])
+
+    decoder.decode_sparse([0])
+    assert decoder.get_observables() == 1
+
+    decoder.decode_sparse([1, 2])
+    assert decoder.get_observables() == 0
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+# A threshold the boundaries never reach: dense mode is on (edge index merge order), but no step is dense
+NEVER_DENSE = 1e9
+
+def predictions(uf, memory, mode=None):
+    decoder = memory.decoder(uf)
+
+    if mode is not None:
+        mode(decoder)
+
+    return decoder.decode_batch(memory.detectionEvents, memory.mapping.detToNode)
+
+@pytest.mark.parametrize("distance, errorRate", [(3, 0.01), (5, 0.01), (9, 0.005)])
+@pytest.mark.parametrize("mode", [
+    lambda decoder: decoder.set_boundary_prune_ratio(-1.0),
+    lambda decoder: decoder.set_boundary_prune_ratio(0.0),
+], ids=["unpruned", "always_pruned"])
+def test_pruning_matches_default_grow(uf, rotatedMemory, distance, errorRate, mode):
+    memory = rotatedMemory(distance, errorRate, 2000)
+
+    np.testing.assert_array_equal(predictions(uf, memory, mode), predictions(uf, memory))
+
+@pytest.mark.parametrize("distance, errorRate", [(3, 0.01), (5, 0.01), (9, 0.005)])
+@pytest.mark.parametrize("threshold", [0.0, 0.2], ids=["dense", "dense_from_0.2"])
+def test_dense_steps_match_sparse_steps(uf, rotatedMemory, distance, errorRate, threshold):
+    # In dense mode, a shot predicts the same whether or not (and whenever) it switches to dense steps
+    memory = rotatedMemory(distance, errorRate, 2000)
+
+    expected = predictions(uf, memory, lambda decoder: decoder.set_dense_grow_threshold(NEVER_DENSE))
+
+    np.testing.assert_array_equal(predictions(uf, memory, lambda decoder: decoder.set_dense_grow_threshold(threshold)), expected)
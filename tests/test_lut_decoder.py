@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+import pytest
+import stim
+
+# The lookup-table decoder falls back to the uf_arch bindings, built by "make binds" in uf_arch/
+pytest.importorskip("uf_arch.uf_arch")
+
+import custom_decoders.uf_arch.lut_decoder as lut
+from custom_decoders.uf_arch.lut_decoder import LookupTable, UFArchLUTCompiledDecoder, UFArchLUTDecoder, enumerateSyndromes, hashRows, tablePath
+from custom_decoders.uf_arch.uf_arch_decoder import UFArchCompiledDecoder, UFArchParams
+
+@pytest.fixture(scope="module")
+def memory(rotatedMemory):
+    return rotatedMemory(3, 0.01, 2000)
+
+@pytest.fixture(scope="module")
+def table(memory):
+    decoder = UFArchCompiledDecoder(UFArchParams(codeType="rotated"), memory.dem)
+    return LookupTable.build(memory.dem, memory.detectionEvents[:1000], decoder.decodeRows)
+
+def test_hash_rows():
+    rows = enumerateSyndromes(20, 2)
+
+    hashes = hashRows(rows)
+
+    assert hashes.dtype == np.uint64
+    assert len(np.unique(hashes)) == len(rows)
+    np.testing.assert_array_equal(hashRows(rows[5]), hashes[5:6])
+    # Rows of other widths hash differently, even with the same detection events
+    assert hashRows(np.zeros((1, 3), dtype=np.uint8))[0] != hashRows(np.zeros((1, 4), dtype=np.uint8))[0]
+
+def test_enumerate_syndromes():
+    rows = enumerateSyndromes(10, 2)
+    weights = np.unpackbits(rows, axis=1, count=10, bitorder='little').sum(axis=1, dtype=np.int64)
+
+    assert rows.shape == (1 + 10 + math.comb(10, 2), 2)
+    assert len(np.unique(rows, axis=0)) == len(rows)
+    np.testing.assert_array_equal(np.bincount(weights), [1, 10, 45])
+
+def test_save_load_round_trip(table, memory, tmp_path):
+    path = tablePath(tmp_path, memory.dem)
+    table.save(path)
+
+    loaded = LookupTable.load(path)
+
+    assert isinstance(loaded.hashes, np.memmap)
+    assert len(loaded) == len(table) > 0
+    assert (loaded.numDetectors, loaded.numObservables, loaded.fingerprint) == (table.numDetectors, table.numObservables, table.fingerprint)
+    np.testing.assert_array_equal(loaded.hashes, table.hashes)
+    np.testing.assert_array_equal(loaded.predictions, table.predictions)
+
+    found, predictions = loaded.lookup(memory.detectionEvents[:1000])
+    assert found.all()
+    np.testing.assert_array_equal(predictions, table.lookup(memory.detectionEvents[:1000])[1])
+
+def test_empty_table_round_trip(memory, tmp_path):
+    table = LookupTable.build(memory.dem, np.zeros((0, memory.detectionEvents.shape[1]), dtype=np.uint8), None)
+    table.save(tmp_path / "empty.lut")
+
+    loaded = LookupTable.load(tmp_path / "empty.lut")
+    found, predictions = loaded.lookup(memory.detectionEvents[:10])
+
+    assert len(loaded) == 0
+    assert not found.any() and len(predictions) == 0
+
+def test_load_rejects_other_files(tmp_path):
+    (tmp_path / "other.lut").write_bytes(bytes(128))
+
+    with pytest.raises(ValueError):
+        LookupTable.load(tmp_path / "other.lut")
+
+def test_colliding_syndromes_are_dropped(memory, monkeypatch):
+    # Rows 0-1 and 2-3 share a hash, row 4 does not
+    monkeypatch.setattr(lut, "hashRows", lambda rows: np.atleast_2d(rows)[:, 0].astype(np.uint64) // 2)
+
+    decodedRows = []
+    def decodeRows(rows):
+        decodedRows.append(rows.copy())
+        return rows[:, :1].copy()
+
+    rows = np.array([[3], [0], [2], [1], [4]], dtype=np.uint8)
+    table = LookupTable.build(memory.dem, rows, decodeRows)
+
+    assert len(table) == 1
+    np.testing.assert_array_equal(decodedRows[0], [[4]])
+
+    found, predictions = table.lookup(np.array([[4], [0], [3], [5]], dtype=np.uint8))
+
+    # Row 5 has the hash of row 4, but was not seen when the table was built
+    np.testing.assert_array_equal(found, [True, False, False, True])
+    np.testing.assert_array_equal(predictions, [[4], [4]])
+
+def test_lut_decoder_matches_uf_arch(table, memory):
+    params = UFArchParams(codeType="rotated")
+    fresh = memory.detectionEvents[1000:]
+
+    expected = UFArchCompiledDecoder(params, memory.dem).decode_shots_bit_packed(bit_packed_detection_event_data=fresh)
+
+    lutDecoder = UFArchLUTCompiledDecoder(params, memory.dem, table)
+    np.testing.assert_array_equal(lutDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=fresh), expected)
+    assert lutDecoder.hits > 0 and lutDecoder.misses > 0
+
+    # Without a table, every shot with detection events falls back to uf_arch
+    fallbackDecoder = UFArchLUTCompiledDecoder(params, memory.dem)
+    np.testing.assert_array_equal(fallbackDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=fresh), expected)
+    assert fallbackDecoder.hits == 0
+    assert fallbackDecoder.misses == np.count_nonzero(fresh.any(axis=1))
+
+def test_table_of_another_model_is_rejected(table):
+    otherDem = stim.Circuit.generated("surface_code:rotated_memory_z", rounds=5, distance=3, after_clifford_depolarization=0.01).detector_error_model()
+
+    with pytest.raises(ValueError):
+        UFArchLUTCompiledDecoder(UFArchParams(codeType="rotated"), otherDem, table)
+
+def test_sinter_decoder_finds_its_table(table, memory, tmp_path):
+    table.save(tablePath(tmp_path, memory.dem))
+
+    decoder = UFArchLUTDecoder(tmp_path)
+    decoder.compile_decoder_for_dem(dem=memory.dem).decode_shots_bit_packed(bit_packed_detection_event_data=memory.detectionEvents[:1000])
+
+    assert decoder.tableHits == np.count_nonzero(memory.detectionEvents[:1000].any(axis=1))
+    assert decoder.tableMisses == 0
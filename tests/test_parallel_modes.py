@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+@pytest.fixture(scope="module")
+def memory(rotatedMemory):
+    return rotatedMemory(7, 0.01, 1000)
+
+def serialPredictions(uf, memory):
+    return memory.decoder(uf).decode_batch(memory.detectionEvents, memory.mapping.detToNode)
+
+def logicalErrors(predictions, memory):
+    return int(np.count_nonzero(predictions[:, 0] != memory.observables[:, 0]))
+
+@pytest.mark.parametrize("partitions, threads, parallelPeeling", [
+    (4, 0, False),
+    (4, 2, False),
+    (4, 2, True),
+    (8, 2, True),
+    (4, 0, True),
+])
+def test_parallel_modes_match_serial(uf, memory, partitions, threads, parallelPeeling):
+    decoder = memory.decoder(uf, partitions, partitions, partitions, partitions, -1, -1)
+    decoder.set_threads(threads)
+    decoder.set_parallel_peeling(parallelPeeling)
+
+    predictions = decoder.decode_batch(memory.detectionEvents, memory.mapping.detToNode)
+
+    np.testing.assert_array_equal(predictions, serialPredictions(uf, memory))
+
+@pytest.mark.parametrize("partitions, threads", [(4, 0), (4, 2), (8, 2)])
+def test_parallel_merge_matches_serial_accuracy(uf, memory, partitions, threads):
+    # The parallel merge builds the same clusters as the serial merge ("make test" checks
+    # them exactly), but may pick other spanning forest edges, so only the accuracy is compared
+    decoder = memory.decoder(uf, partitions, partitions, partitions, partitions, -1, -1)
+    decoder.set_threads(threads)
+    decoder.set_parallel_merge(True)
+    decoder.set_parallel_peeling(True)
+
+    errors = logicalErrors(decoder.decode_batch(memory.detectionEvents, memory.mapping.detToNode), memory)
+    serialErrors = logicalErrors(serialPredictions(uf, memory), memory)
+
+    assert abs(errors - serialErrors) <= max(10, 0.1 * serialErrors)
+
+def test_decode_sparse_matches_full_reset(uf, memory):
+    # The sparse decoder is reused across shots and only resets what the previous shot touched
+    sparseDecoder = memory.decoder(uf)
+    fullResetDecoder = memory.decoder(uf)
+
+    for shot in range(len(memory.detectionEvents)):
+        defects = memory.defects(shot)
+
+        syndromes = [False] * fullResetDecoder.get_node_count()
+        for node in defects:
+            syndromes[node] = True
+
+        sparseDecoder.decode_sparse(defects)
+        fullResetDecoder.decode(syndromes)
+
+        assert sparseDecoder.get_observables() == fullResetDecoder.get_observables()
+        assert sparseDecoder.get_horizontal_corrections() == fullResetDecoder.get_horizontal_corrections()
+
+def test_bit_sliced_matches_sparse(uf, rotatedMemory):
+    memory = rotatedMemory(5, 0.002, 2000)
+
+    decoder = memory.decoder(uf)
+    decoder.set_bit_sliced(True)
+    predictions = decoder.decode_batch(memory.detectionEvents, memory.mapping.detToNode)
+
+    assert decoder.get_bit_sliced_shots() > 0
+    np.testing.assert_array_equal(predictions, serialPredictions(uf, memory))
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from custom_decoders.prediction_cache import PredictionCache
+
+class CountingDecoder():
+    """
+    Predicts the first byte of each row as its observables, and counts the rows it decodes.
+    """
+    def __init__(self):
+        self.decodedRows = 0
+
+    def __call__(self, rows):
+        self.decodedRows += len(rows)
+        return rows[:, :1].copy()
+
+def shots(*syndromes):
+    return np.array([[syndrome, 0] for syndrome in syndromes], dtype=np.uint8)
+
+def test_repeated_syndromes_are_decoded_once():
+    cache = PredictionCache(8)
+    decoder = CountingDecoder()
+
+    predictions = cache.decode(shots(1, 2, 1, 1, 3), 1, decoder)
+
+    np.testing.assert_array_equal(predictions[:, 0], [1, 2, 1, 1, 3])
+    assert decoder.decodedRows == 3
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    predictions = cache.decode(shots(3, 2, 4), 1, decoder)
+
+    np.testing.assert_array_equal(predictions[:, 0], [3, 2, 4])
+    assert decoder.decodedRows == 4
+    assert (cache.hits, cache.misses) == (4, 4)
+    assert cache.hitRate == 0.5
+
+def test_capacity_bounds_the_entries():
+    cache = PredictionCache(3)
+    decoder = CountingDecoder()
+
+    predictions = cache.decode(shots(*range(10)), 1, decoder)
+
+    np.testing.assert_array_equal(predictions[:, 0], range(10))
+    assert len(cache.entries) == 3
+    assert list(cache.entries) == [shots(i)[0].tobytes() for i in (7, 8, 9)]
+
+@pytest.mark.parametrize("eviction, kept", [("lru", (1, 3)), ("fifo", (2, 3))])
+def test_eviction_policies(eviction, kept):
+    cache = PredictionCache(2, eviction)
+    decoder = CountingDecoder()
+
+    cache.decode(shots(1, 2), 1, decoder)
+    # A hit refreshes syndrome 1 for LRU only, so syndrome 3 evicts 2 (LRU) or 1 (FIFO)
+    cache.decode(shots(1), 1, decoder)
+    cache.decode(shots(3), 1, decoder)
+
+    assert sorted(cache.entries) == sorted(shots(*kept)[i].tobytes() for i in range(2))
+
+    decoder.decodedRows = 0
+    cache.decode(shots(*kept), 1, decoder)
+    assert decoder.decodedRows == 0
+
+def test_cached_predictions_are_copies():
+    cache = PredictionCache(4)
+
+    predictions = cache.decode(shots(5), 1, CountingDecoder())
+    predictions[:] = 0
+
+    np.testing.assert_array_equal(cache.decode(shots(5), 1, CountingDecoder()), [[5]])
+
+@pytest.mark.parametrize("capacity, eviction", [(0, "lru"), (4, "random")])
+def test_invalid_parameters_are_rejected(capacity, eviction):
+    with pytest.raises(ValueError):
+        PredictionCache(capacity, eviction)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("qsurface.main")
+
+from custom_decoders.unionfind.union_find_decoder import UnionFindCompiledDecoder, predict_from_qsurface
+
+CODE_TYPE = "surface_code:rotated_memory_z"
+
+@pytest.mark.parametrize("distance, errorRate", [(3, 0.02), (5, 0.01)])
+def test_reused_lattice_matches_fresh_lattices(rotatedMemory, distance, errorRate):
+    memory = rotatedMemory(distance, errorRate, 200)
+    compiled = UnionFindCompiledDecoder(CODE_TYPE, memory.dem)
+
+    # Every shot decoded on the lattice built for the DEM, one after the other, with the
+    # observable flags of its edges (the fresh lattices parse the names of the matched edges)
+    reused = compiled.decodeRows(memory.detectionEvents)
+
+    unpackedShots = np.unpackbits(memory.detectionEvents, axis=1, count=memory.dem.num_detectors, bitorder='little')
+    fresh = [predict_from_qsurface(unpacked, CODE_TYPE, compiled.convCoords, compiled.distance, compiled.rounds) for unpacked in unpackedShots]
+
+    np.testing.assert_array_equal(reused, np.packbits(fresh, axis=1, bitorder='little'))
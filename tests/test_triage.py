@@ -0,0 +1,48 @@
+import numpy as np
+
+from custom_decoders.triage import ShotTriage
+
+class RecordingDecoder():
+    """
+    Predicts the first byte of each row as its observables, and records the rows it decodes.
+    """
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, rows):
+        self.batches.append(rows.copy())
+        return rows[:, :1].copy()
+
+def test_only_shots_with_detection_events_are_decoded():
+    triage = ShotTriage()
+    decoder = RecordingDecoder()
+
+    shots = np.array([[0, 0], [3, 0], [0, 0], [0, 1], [0, 0]], dtype=np.uint8)
+    predictions = triage.decode(shots, 1, decoder)
+
+    np.testing.assert_array_equal(predictions, [[0], [3], [0], [0], [0]])
+    assert len(decoder.batches) == 1
+    np.testing.assert_array_equal(decoder.batches[0], shots[[1, 3]])
+
+    assert (triage.totalShots, triage.triagedShots) == (5, 3)
+    assert triage.triagedFraction == 0.6
+
+def test_batches_without_detection_events_skip_the_decoder():
+    triage = ShotTriage()
+    decoder = RecordingDecoder()
+
+    predictions = triage.decode(np.zeros((4, 3), dtype=np.uint8), 9, decoder)
+
+    assert predictions.shape == (4, 2)
+    assert not predictions.any()
+    assert decoder.batches == []
+    assert triage.triagedFraction == 1.0
+
+def test_counters_accumulate_over_batches():
+    triage = ShotTriage()
+    assert triage.triagedFraction == 0.0
+
+    triage.decode(np.array([[1], [2]], dtype=np.uint8), 1, RecordingDecoder())
+    triage.decode(np.array([[0], [2]], dtype=np.uint8), 1, RecordingDecoder())
+
+    assert (triage.totalShots, triage.triagedShots) == (4, 1)
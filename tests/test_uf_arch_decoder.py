@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+# The adapter imports the uf_arch bindings, built by "make binds" in uf_arch/
+pytest.importorskip("uf_arch.uf_arch")
+
+from custom_decoders.uf_arch.dem_graph import BORDER_NODE
+from custom_decoders.uf_arch.uf_arch_decoder import UFArchCompiledDecoder, UFArchParams
+
+@pytest.fixture(scope="module", params=[3, 5, 7])
+def memory(request, rotatedMemory):
+    return rotatedMemory(request.param, 0.01, 500, seed=3)
+
+def baselinePrediction(uf, memory, decoder, shot):
+    # The per-shot path of the original adapter: the observable is the parity of the
+    # horizontal corrections on the last column of the lattice
+    try:
+        decoder.decode(memory.baselineSample(shot))
+    except Exception:
+        return 0
+
+    parity = 0
+    for correction in decoder.get_horizontal_corrections():
+        if correction[2] == memory.mapping.distance - 1:
+            parity ^= 1
+
+    return parity
+
+def test_compiled_decoder_matches_per_shot_adapter(uf, memory):
+    compiledDecoder = UFArchCompiledDecoder(UFArchParams(codeType="rotated"), memory.dem)
+    predictions = compiledDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=memory.detectionEvents)
+
+    decoder = uf.UnionFindDecoder(memory.mapping.distance, memory.mapping.rounds, uf.CodeType.ROTATED, 1, 1, 1, 1, -1, -1)
+    expected = [baselinePrediction(uf, memory, decoder, shot) for shot in range(len(memory.detectionEvents))]
+
+    assert predictions.shape == (len(memory.detectionEvents), 1)
+    np.testing.assert_array_equal(predictions[:, 0], expected)
+
+def test_observable_masks_match_single_errors(uf, memory):
+    decoder = memory.decoder(uf)
+    masks = memory.mapping.observableMasks(memory.dem, np.array(decoder.edge_nodes))
+
+    assert masks.dtype == np.uint64
+    assert len(masks) == decoder.get_edge_count()
+    assert np.count_nonzero(masks) > 0
+
+    edges = {tuple(sorted(nodes)) for nodes in np.array(decoder.edge_nodes).reshape(-1, 2).tolist()}
+    checked, flips = 0, 0
+
+    # A single mechanism on a lattice edge is corrected along the edge itself
+    for instruction in memory.dem.flattened():
+        if instruction.type != "error":
+            continue
+
+        targets = instruction.targets_copy()
+        dets = [target.val for target in targets if target.is_relative_detector_id()]
+        nodes = sorted(int(node) for node in memory.mapping.detToNode[dets])
+
+        # Mechanisms with an X stabilizer detector (node -1) are not lattice edges
+        if any(target.is_separator() for target in targets) or min(nodes, default=-1) < 0:
+            continue
+
+        if (tuple(nodes) if len(nodes) == 2 else (BORDER_NODE, *nodes)) not in edges:
+            continue
+
+        expected = 0
+        for target in targets:
+            if target.is_logical_observable_id():
+                expected ^= 1 << target.val
+
+        decoder.decode_sparse(nodes)
+        assert decoder.get_observables() == expected
+        checked += 1
+        flips += expected != 0
+
+    assert checked > flips > 0
+
+def test_triage_does_not_change_predictions(rotatedMemory):
+    # At a low error rate, a good fraction of the shots have no detection events
+    memory = rotatedMemory(5, 0.001, 500)
+
+    compiledDecoder = UFArchCompiledDecoder(UFArchParams(codeType="rotated"), memory.dem)
+    predictions = compiledDecoder.decode_shots_bit_packed(bit_packed_detection_event_data=memory.detectionEvents)
+
+    # The shots without detection events are predicted by the triage, the others by the decoder
+    np.testing.assert_array_equal(predictions, compiledDecoder.decodeRows(memory.detectionEvents))
+
+    triaged = np.count_nonzero(~memory.detectionEvents.any(axis=1))
+    assert triaged > 0
+    assert compiledDecoder.triage.triagedShots == triaged
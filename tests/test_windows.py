@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+WINDOW_ROUNDS = 10
+COMMIT_ROUNDS = 5
+
+@pytest.fixture(scope="module")
+def memory(rotatedMemory):
+    return rotatedMemory(5, 0.005, 300, rounds=30)
+
+def windowDecoder(uf, memory):
+    decoder = memory.decoder(uf, rounds=WINDOW_ROUNDS)
+    decoder.set_window(COMMIT_ROUNDS, memory.mapping.rounds)
+    return decoder
+
+def test_window_needs_fewer_committed_rounds(uf, memory):
+    decoder = memory.decoder(uf, rounds=WINDOW_ROUNDS)
+
+    with pytest.raises(ValueError):
+        decoder.set_window(WINDOW_ROUNDS, memory.mapping.rounds)
+
+def test_stream_rounds_match_decode_stream(uf, memory):
+    streamDecoder = windowDecoder(uf, memory)
+    roundDecoder = windowDecoder(uf, memory)
+
+    nodesPerRound = roundDecoder.get_node_count() // WINDOW_ROUNDS
+
+    for shot in range(len(memory.detectionEvents)):
+        defects = memory.defects(shot)
+
+        streamDecoder.decode_stream(defects, memory.mapping.rounds)
+
+        roundDecoder.stream_reset()
+        for round in range(memory.mapping.rounds):
+            roundDecoder.stream_round([node % nodesPerRound for node in defects if node // nodesPerRound == round])
+        roundDecoder.stream_finish()
+
+        assert roundDecoder.get_observables() == streamDecoder.get_observables()
+
+def test_reused_window_decoder_matches_fresh_ones(uf, memory):
+    predictions = windowDecoder(uf, memory).decode_batch(memory.detectionEvents, memory.mapping.detToNode)
+
+    for shot in range(0, len(memory.detectionEvents), 30):
+        fresh = windowDecoder(uf, memory).decode_batch(memory.detectionEvents[shot:shot + 1], memory.mapping.detToNode)
+        np.testing.assert_array_equal(fresh[0], predictions[shot])
+
+def test_parallel_windows_match_serial_windows(uf, memory):
+    masks = memory.mapping.observableMasks(memory.dem, np.array(memory.decoder(uf).edge_nodes))
+
+    predictions = []
+    for threads in [0, 2]:
+        decoder = uf.ParallelWindowDecoder(memory.mapping.distance, memory.mapping.rounds, COMMIT_ROUNDS, COMMIT_ROUNDS, threads)
+        decoder.set_observable_masks(masks)
+        predictions.append(decoder.decode_batch(memory.detectionEvents, memory.mapping.detToNode))
+
+    np.testing.assert_array_equal(predictions[0], predictions[1])
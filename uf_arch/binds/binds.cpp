@@ -1,10 +1,59 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
+
+#include <stdexcept>
 
 #include "../src/union_find.hpp"
+#include "../src/repetition_decoder.hpp"
+#include "../src/parallel_window_decoder.hpp"
 
 namespace py = pybind11;
 
+typedef py::array_t<uint8_t, py::array::c_style | py::array::forcecast> PackedArray;
+typedef py::array_t<int32_t, py::array::c_style | py::array::forcecast> IndexArray;
+
+/*
+    Decodes a (num_shots, ceil(num_dets/8)) array of bit-packed detection events
+    and returns a (num_shots, ceil(num_observables/8)) array of bit-packed observable predictions.
+*/
+template <typename Decoder>
+py::array_t<uint8_t> decode_batch(Decoder& decoder, PackedArray detection_events, IndexArray det_to_node, size_t num_observables)
+{
+    if (detection_events.ndim() != 2)
+        throw std::invalid_argument("detection_events must be a 2D array of bit-packed shots.");
+
+    if (det_to_node.ndim() != 1)
+        throw std::invalid_argument("det_to_node must be a 1D array of node indices.");
+
+    if (num_observables > 64)
+        throw std::invalid_argument("At most 64 observables are supported.");
+
+    auto num_shots = detection_events.shape(0);
+    auto num_det_bytes = detection_events.shape(1);
+    auto num_obs_bytes = (num_observables + 7) / 8;
+
+    py::array_t<uint8_t> predictions({num_shots, (py::ssize_t)num_obs_bytes});
+
+    {
+        py::gil_scoped_release release;
+        decoder.decode_batch(detection_events.data(), num_shots, num_det_bytes, det_to_node.data(), det_to_node.shape(0), predictions.mutable_data(), num_obs_bytes);
+    }
+
+    return predictions;
+}
+
+/*
+    Builds a decoder on an arbitrary decoding graph, given as a (num_edges, 2) array
+    (or a flat array) of edge endpoints, -1 for the border.
+*/
+UnionFindDecoder* make_graph_decoder(unsigned int num_nodes, IndexArray edge_nodes, int I, int G, int C, int P, int early_stopping, int early_peeling)
+{
+    std::vector<NodeIndex> edgeNodes(edge_nodes.data(), edge_nodes.data() + edge_nodes.size());
+
+    return new UnionFindDecoder(num_nodes, edgeNodes, I, G, C, P, early_stopping, early_peeling);
+}
+
 PYBIND11_MODULE(uf_arch, m)
 {
     m.doc() = "Union-Find decoder bindings"; // Optional module docstring
@@ -13,22 +62,84 @@ PYBIND11_MODULE(uf_arch, m)
         .value("UNROTATED", CodeType::UNROTATED)
         .value("ROTATED", CodeType::ROTATED)
         .value("REPETITION", CodeType::REPETITION)
+        .value("GRAPH", CodeType::GRAPH)
         .export_values();
 
     py::class_<Stats>(m, "Stats")
         .def(py::init<>())
         .def_readwrite("num_grow_merge_iters", &Stats::num_grow_merge_iters)
         .def_readwrite("boundaries_per_iter", &Stats::boundaries_per_iter)
+        .def_readwrite("effective_boundaries_per_iter", &Stats::effective_boundaries_per_iter)
         .def_readwrite("merges_per_iter", &Stats::merges_per_iter)
         .def_readwrite("odd_clusters_per_iter", &Stats::odd_clusters_per_iter)
-        .def_readwrite("num_peeling_iters", &Stats::num_peeling_iters);
+        .def_readwrite("dense_grow_per_iter", &Stats::dense_grow_per_iter)
+        .def_readwrite("num_peeling_iters", &Stats::num_peeling_iters)
+        .def_readwrite("peeling_clusters_per_iter", &Stats::peeling_clusters_per_iter)
+        .def_readwrite("peeling_leaves_per_iter", &Stats::peeling_leaves_per_iter);
+
+    py::class_<PredecoderStats>(m, "PredecoderStats")
+        .def(py::init<>())
+        .def_readonly("shots", &PredecoderStats::shots)
+        .def_readonly("skipped_shots", &PredecoderStats::skipped_shots)
+        .def_readonly("matched_pairs", &PredecoderStats::matched_pairs)
+        .def_readonly("matched_singletons", &PredecoderStats::matched_singletons)
+        .def_readonly("leftover_defects", &PredecoderStats::leftover_defects);
 
     py::class_<UnionFindDecoder>(m, "UnionFindDecoder")
         .def(py::init<unsigned int, unsigned int, CodeType>())
         .def(py::init<unsigned int, unsigned int, CodeType, int, int, int, int, int, int>())
+        .def(py::init(&make_graph_decoder), py::arg("num_nodes"), py::arg("edge_nodes"),
+            py::arg("I") = 1, py::arg("G") = 1, py::arg("C") = 1, py::arg("P") = 1,
+            py::arg("early_stopping") = -1, py::arg("early_peeling") = -1)
         .def("decode", &UnionFindDecoder::decode)
+        .def("decode_sparse", &UnionFindDecoder::decode_sparse, py::arg("defects"))
         .def("initCluster", &UnionFindDecoder::initCluster)
         .def("grow", &UnionFindDecoder::grow)
         .def("get_stats", &UnionFindDecoder::get_stats)
-        .def("get_horizontal_corrections", &UnionFindDecoder::get_horizontal_corrections);
+        .def("set_window", &UnionFindDecoder::set_window, py::arg("commit_rounds"), py::arg("stream_rounds") = 0)
+        .def("stream_reset", &UnionFindDecoder::stream_reset)
+        .def("stream_round", &UnionFindDecoder::stream_round, py::arg("defects"))
+        .def("stream_finish", &UnionFindDecoder::stream_finish)
+        .def("decode_stream", &UnionFindDecoder::decode_stream, py::arg("defects"), py::arg("num_rounds"))
+        .def("get_horizontal_corrections", &UnionFindDecoder::get_horizontal_corrections)
+        .def("get_observable_parity", &UnionFindDecoder::get_observable_parity)
+        .def("get_observables", &UnionFindDecoder::get_observables)
+        .def("set_observable_masks", &UnionFindDecoder::set_observable_masks, py::arg("masks"))
+        .def("get_observable_masks", &UnionFindDecoder::get_observable_masks)
+        .def("get_node_count", &UnionFindDecoder::getNodeCount)
+        .def("get_edge_count", &UnionFindDecoder::getEdgeCount)
+        .def_readonly("edge_nodes", &UnionFindDecoder::edge_nodes)
+        .def("set_threads", &UnionFindDecoder::set_threads, py::arg("num_threads"))
+        .def("get_threads", &UnionFindDecoder::get_threads)
+        .def("set_parallel_merge", &UnionFindDecoder::set_parallel_merge, py::arg("enabled"))
+        .def("set_parallel_peeling", &UnionFindDecoder::set_parallel_peeling, py::arg("enabled"))
+        .def("set_bit_sliced", &UnionFindDecoder::set_bit_sliced, py::arg("enabled"))
+        .def("get_bit_sliced_shots", &UnionFindDecoder::get_bit_sliced_shots)
+        .def("set_dense_grow_threshold", &UnionFindDecoder::set_dense_grow_threshold, py::arg("fraction"))
+        .def("set_predecoder", &UnionFindDecoder::set_predecoder, py::arg("enabled"))
+        .def("get_predecoder_stats", &UnionFindDecoder::get_predecoder_stats)
+        .def("set_boundary_prune_ratio", &UnionFindDecoder::set_boundary_prune_ratio, py::arg("ratio"))
+        .def("decode_batch", &decode_batch<UnionFindDecoder>, py::arg("detection_events"), py::arg("det_to_node"), py::arg("num_observables") = 1);
+
+    py::class_<ParallelWindowDecoder>(m, "ParallelWindowDecoder")
+        .def(py::init<unsigned int, unsigned int, unsigned int, unsigned int, unsigned int>(),
+            py::arg("distance"), py::arg("rounds"), py::arg("commit_rounds"), py::arg("buffer_rounds"), py::arg("num_threads") = 0)
+        .def("decode_sparse", &ParallelWindowDecoder::decode_sparse, py::arg("defects"))
+        .def("get_observables", &ParallelWindowDecoder::get_observables)
+        .def("set_observable_masks", &ParallelWindowDecoder::set_observable_masks, py::arg("masks"))
+        .def("get_windows", &ParallelWindowDecoder::get_windows)
+        .def("get_threads", &ParallelWindowDecoder::get_threads)
+        .def("decode_batch", &decode_batch<ParallelWindowDecoder>, py::arg("detection_events"), py::arg("det_to_node"), py::arg("num_observables") = 1);
+
+    py::class_<RepetitionDecoder>(m, "RepetitionDecoder")
+        .def(py::init<unsigned int, unsigned int, int>(), py::arg("distance"), py::arg("rounds"), py::arg("diagonal_offset") = 0)
+        .def("decode_sparse", &RepetitionDecoder::decode_sparse, py::arg("defects"))
+        .def("get_observables", &RepetitionDecoder::get_observables)
+        .def("set_observable_masks", &RepetitionDecoder::set_observable_masks, py::arg("masks"))
+        .def("get_observable_masks", &RepetitionDecoder::get_observable_masks)
+        .def("get_matched_edges", &RepetitionDecoder::get_matched_edges)
+        .def("get_node_count", &RepetitionDecoder::getNodeCount)
+        .def("get_edge_count", &RepetitionDecoder::getEdgeCount)
+        .def_readonly("edge_nodes", &RepetitionDecoder::edge_nodes)
+        .def("decode_batch", &decode_batch<RepetitionDecoder>, py::arg("detection_events"), py::arg("det_to_node"), py::arg("num_observables") = 1);
 }
\ No newline at end of file
@@ -77,7 +77,7 @@ void generate_validation_files()
         std::ofstream outputFile(OUTPUT_FILE, std::ios::app);
         if (outputFile.is_open())
         {
-            auto erasureMap = get_erasure_map(ufDecoder.edge_support, ufDecoder.vertical_edge_support, ROUNDS, CODE_TYPE, DISTANCE);
+            auto erasureMap = get_erasure_map(ufDecoder.edge_state.data(), ufDecoder.edge_state.data() + ufDecoder.getHorizontalEdgeCount(), ROUNDS, CODE_TYPE, DISTANCE);
             for (const auto& entry : erasureMap)
             {
                 outputFile << entry.first << ": " << entry.second << "|";
@@ -123,7 +123,7 @@ void decode_specific(int index)
             ufDecoder.initCluster(syndromes);
             ufDecoder.grow();
 
-            auto erasureMap = get_erasure_map(ufDecoder.edge_support, ufDecoder.vertical_edge_support, ROUNDS, CODE_TYPE, DISTANCE);
+            auto erasureMap = get_erasure_map(ufDecoder.edge_state.data(), ufDecoder.edge_state.data() + ufDecoder.getHorizontalEdgeCount(), ROUNDS, CODE_TYPE, DISTANCE);
             for (const auto& entry : erasureMap)
             {
                 std::cout << entry.first << ": " << entry.second << "|";
@@ -168,7 +168,7 @@ void randomSyndromeDecoding(int initParallelParam = 1, int growParallelParam = 1
         std::cout << "(" << std::get<0>(c) << ", " << std::get<1>(c) << ", " << std::get<2>(c) << ") ";
     std::cout << std::endl;
 
-    // auto erasureMap = get_erasure_map(ufDecoder.edge_support, ufDecoder.vertical_edge_support, ROUNDS, CODE_TYPE, DISTANCE);
+    // auto erasureMap = get_erasure_map(ufDecoder.edge_state.data(), ufDecoder.edge_state.data() + ufDecoder.getHorizontalEdgeCount(), ROUNDS, CODE_TYPE, DISTANCE);
     
     // for (const auto& entry : erasureMap)
     //     if (entry.second == -2)
@@ -184,6 +184,11 @@ void randomSyndromeDecoding(int initParallelParam = 1, int growParallelParam = 1
         std::cout << b << " ";
     std::cout << std::endl;
 
+    std::cout << "Average effective boundaries per iteration: ";
+    for (const auto& b : stats.effective_boundaries_per_iter)
+        std::cout << b << " ";
+    std::cout << std::endl;
+
     std::cout << "Average merges per iteration: ";
     for (const auto& m : stats.merges_per_iter)
         std::cout << m << " ";
@@ -195,11 +200,261 @@ void randomSyndromeDecoding(int initParallelParam = 1, int growParallelParam = 1
     std::cout << std::endl;
 }
 
-int main()
+/*
+    Times the initialization, Grow&Merge and peeling stages separately, on random
+    syndromes with the given per-node probability. If numThreads is not 0, the
+    partitions of the init and grow stages run on numThreads threads.
+*/
+void benchmarkDecoding(unsigned int distance, float probability, int shots, int initParallelParam = 1, int growParallelParam = 1, unsigned int numThreads = 0)
+{
+    auto rounds = distance + 1;
+    auto nodeCols = getNodeColsByCodeAndDistance(CODE_TYPE, distance);
+    auto nodeRows = getNodeRowsByCodeAndDistance(CODE_TYPE, distance);
+
+    UnionFindDecoder ufDecoder(distance, rounds, CODE_TYPE, initParallelParam, growParallelParam);
+    ufDecoder.set_threads(numThreads);
+
+    std::vector<std::vector<bool>> syndromes;
+    for (int i = 0; i < shots; i++)
+        syndromes.push_back(generate_random_syndrome(nodeCols * nodeRows * rounds, probability, i));
+
+    double initTime = 0, growMergeTime = 0, peelTime = 0;
+
+    for (auto& syndrome : syndromes)
+    {
+        auto start = std::chrono::high_resolution_clock::now();
+        ufDecoder.initCluster(syndrome);
+        auto afterInit = std::chrono::high_resolution_clock::now();
+        ufDecoder.growMerge();
+        auto afterGrowMerge = std::chrono::high_resolution_clock::now();
+        ufDecoder.peel();
+        auto end = std::chrono::high_resolution_clock::now();
+
+        initTime += std::chrono::duration<double, std::micro>(afterInit - start).count();
+        growMergeTime += std::chrono::duration<double, std::micro>(afterGrowMerge - afterInit).count();
+        peelTime += std::chrono::duration<double, std::micro>(end - afterGrowMerge).count();
+    }
+
+    std::cout << "d=" << distance << ", p=" << probability << " (" << shots << " shots, " << numThreads << " threads), average time per shot: ";
+    std::cout << "init " << initTime / shots << " us, ";
+    std::cout << "grow&merge " << growMergeTime / shots << " us, ";
+    std::cout << "peel " << peelTime / shots << " us" << std::endl;
+}
+
+/*
+    Returns the odd clusters of the decoder as sorted lists of nodes, in a canonical order
+    that does not depend on which node is the root of each cluster.
+*/
+std::vector<std::vector<NodeIndex>> getOddClusterNodes(UnionFindDecoder& ufDecoder)
+{
+    std::vector<std::vector<NodeIndex>> oddClusterNodes;
+
+    for (auto root : ufDecoder.get_odd_clusters())
+    {
+        std::vector<NodeIndex> nodes;
+
+        for (NodeIndex node = 0; node < (NodeIndex)ufDecoder.getNodeCount(); node++)
+            if (ufDecoder.find(node) == root)
+                nodes.push_back(node);
+
+        oddClusterNodes.push_back(nodes);
+    }
+
+    std::sort(oddClusterNodes.begin(), oddClusterNodes.end());
+
+    return oddClusterNodes;
+}
+
+/*
+    Differential test of the parallel merge against the serial merge: for each random
+    syndrome and each number of Grow&Merge iterations (through earlyStoppingParam), the
+    odd clusters left by the two merges must contain exactly the same nodes.
+*/
+int validateParallelMerge(unsigned int distance, float probability, int shots, int clusterParallelParam = 4, unsigned int numThreads = 4)
 {
+    auto rounds = distance + 1;
+    auto maxIterations = 2 * distance;
+
+    std::vector<UnionFindDecoder> serialDecoders;
+    std::vector<UnionFindDecoder> parallelDecoders;
+
+    for (unsigned int iterations = 1; iterations <= maxIterations; iterations++)
+    {
+        serialDecoders.emplace_back(distance, rounds, CODE_TYPE, 1, 1, 1, 1, iterations);
+        parallelDecoders.emplace_back(distance, rounds, CODE_TYPE, 1, 1, clusterParallelParam, 1, iterations);
+
+        parallelDecoders.back().set_threads(numThreads);
+        parallelDecoders.back().set_parallel_merge(true);
+    }
+
+    int mismatches = 0;
+
+    for (int i = 0; i < shots; i++)
+    {
+        auto syndromes = generate_random_syndrome(serialDecoders[0].getNodeCount(), probability, i);
+
+        for (unsigned int iterations = 0; iterations < maxIterations; iterations++)
+        {
+            auto& serialDecoder = serialDecoders[iterations];
+            auto& parallelDecoder = parallelDecoders[iterations];
+
+            serialDecoder.initCluster(syndromes);
+            serialDecoder.growMerge();
+
+            parallelDecoder.initCluster(syndromes);
+            parallelDecoder.growMerge();
+
+            if (getOddClusterNodes(serialDecoder) != getOddClusterNodes(parallelDecoder))
+            {
+                std::cout << "Mismatch at shot " << i << ", iteration " << iterations + 1 << std::endl;
+                mismatches++;
+                break;
+            }
+
+            if (serialDecoder.get_odd_clusters().empty())
+                break;
+        }
+    }
+
+    std::cout << "Parallel merge validation (d=" << distance << ", p=" << probability << ", " << shots << " shots): ";
+    std::cout << mismatches << " mismatches" << std::endl;
+
+    return mismatches;
+}
+
+/*
+    Differential test of the per-cluster peeling against the serial peeling: for each
+    random syndrome, the two decoders must predict the same corrections.
+*/
+int validateParallelPeeling(unsigned int distance, float probability, int shots, int clusterParallelParam = 4, int peelingParallelParam = 2, unsigned int numThreads = 4)
+{
+    auto rounds = distance + 1;
+
+    UnionFindDecoder serialDecoder(distance, rounds, CODE_TYPE);
+    UnionFindDecoder parallelDecoder(distance, rounds, CODE_TYPE, 1, 1, clusterParallelParam, peelingParallelParam);
+
+    parallelDecoder.set_threads(numThreads);
+    parallelDecoder.set_parallel_peeling(true);
+
+    int mismatches = 0;
+
+    for (int i = 0; i < shots; i++)
+    {
+        auto syndromes = generate_random_syndrome(serialDecoder.getNodeCount(), probability, i);
+
+        serialDecoder.decode(syndromes);
+        parallelDecoder.decode(syndromes);
+
+        if (serialDecoder.get_horizontal_corrections() != parallelDecoder.get_horizontal_corrections() ||
+            serialDecoder.get_observables() != parallelDecoder.get_observables())
+        {
+            std::cout << "Mismatch at shot " << i << std::endl;
+            mismatches++;
+        }
+    }
+
+    std::cout << "Parallel peeling validation (d=" << distance << ", p=" << probability << ", " << shots << " shots): ";
+    std::cout << mismatches << " mismatches" << std::endl;
+
+    return mismatches;
+}
+
+/*
+    Differential test of the lazy reset of decode_sparse: a decoder reused across random
+    syndromes, resetting only the state touched by the previous shot, must predict the
+    same corrections as a decoder resetting the whole lattice on every shot (decode).
+*/
+int validateLazyReset(unsigned int distance, float probability, int shots)
+{
+    auto rounds = distance + 1;
+
+    UnionFindDecoder fullResetDecoder(distance, rounds, CODE_TYPE);
+    UnionFindDecoder sparseDecoder(distance, rounds, CODE_TYPE);
+
+    int mismatches = 0;
+
+    for (int i = 0; i < shots; i++)
+    {
+        auto syndromes = generate_random_syndrome(fullResetDecoder.getNodeCount(), probability, i);
+
+        std::vector<NodeIndex> defects;
+        for (NodeIndex node = 0; node < (NodeIndex)syndromes.size(); node++)
+            if (syndromes[node])
+                defects.push_back(node);
+
+        fullResetDecoder.decode(syndromes);
+        sparseDecoder.decode_sparse(defects);
+
+        if (fullResetDecoder.get_horizontal_corrections() != sparseDecoder.get_horizontal_corrections() ||
+            fullResetDecoder.get_observables() != sparseDecoder.get_observables())
+        {
+            std::cout << "Mismatch at shot " << i << std::endl;
+            mismatches++;
+        }
+    }
+
+    std::cout << "Lazy reset validation (d=" << distance << ", p=" << probability << ", " << shots << " shots): ";
+    std::cout << mismatches << " mismatches" << std::endl;
+
+    return mismatches;
+}
+
+/*
+    Runs the differential tests of the parallel and lazy modes against the serial decoder
+    ("make test"), over a range of distances and syndrome densities.
+
+    @return The total number of mismatches.
+*/
+int runValidations()
+{
+    int mismatches = 0;
+
+    for (unsigned int distance : {5, 11})
+    {
+        for (float probability : {0.01f, 0.05f})
+        {
+            mismatches += validateParallelMerge(distance, probability, 100);
+            mismatches += validateParallelMerge(distance, probability, 100, 8, 2);
+            mismatches += validateParallelPeeling(distance, probability, 200);
+            mismatches += validateParallelPeeling(distance, probability, 200, 8, 1000, 2);
+            mismatches += validateLazyReset(distance, probability, 500);
+        }
+    }
+
+    return mismatches;
+}
+
+/*
+    Runs the stage benchmarks ("make bench"): small and large lattices, from sparse
+    syndromes (few clusters, short Grow&Merge loops) to dense ones (hundreds of clusters).
+*/
+void runBenchmarks()
+{
+    for (unsigned int distance : {11, 27})
+    {
+        for (float probability : {0.001f, 0.01f, 0.03f})
+            benchmarkDecoding(distance, probability, distance > 11 ? 300 : 3000);
+    }
+}
+
+int main(int argc, char* argv[])
+{
+    if (argc > 1 && std::string(argv[1]) == "test")
+        return runValidations() ? 1 : 0;
+
+    if (argc > 1 && std::string(argv[1]) == "bench")
+    {
+        runBenchmarks();
+        return 0;
+    }
+
     // generate_validation_files();    
     // decode_specific(16484);
     randomSyndromeDecoding(4, 4, -1);
+    // benchmarkDecoding(DISTANCE, 0.01, 1000);
+    // benchmarkDecoding(DISTANCE, 0.01, 1000, 8, 8, 8);
+    // validateParallelMerge(11, 0.05, 200);
+    // validateParallelPeeling(11, 0.05, 200);
 
     return 0;
 }
\ No newline at end of file
@@ -0,0 +1,258 @@
+#include "parallel_window_decoder.hpp"
+
+#include <algorithm>
+#include <cstring>
+
+ParallelWindowDecoder::ParallelWindowDecoder(unsigned int distance, unsigned int rounds, unsigned int commitRounds, unsigned int bufferRounds, unsigned int numThreads)
+{
+    if (rounds == 0 || commitRounds == 0 || bufferRounds == 0)
+        throw std::invalid_argument("rounds, commitRounds and bufferRounds must be positive.");
+
+    this->distance = distance;
+    this->rounds = rounds;
+    this->commitRounds = commitRounds;
+    this->bufferRounds = bufferRounds;
+
+    this->nodesPerRound = getNodeRowsByCodeAndDistance(CodeType::ROTATED, distance) * getNodeColsByCodeAndDistance(CodeType::ROTATED, distance);
+    this->edgesPerRound = getEdgeRowsByCodeAndDistance(CodeType::ROTATED, distance) * getEdgeColsByCodeAndDistance(CodeType::ROTATED, distance);
+    this->numNodes = rounds * nodesPerRound;
+    this->numEdges = rounds * edgesPerRound + numNodes;
+
+    // Commit regions and gaps alternate, the last commit region takes the rounds left if they do not fill a gap
+    for (unsigned int commitFirst = 0; ; )
+    {
+        auto commitLast = std::min(commitFirst + commitRounds, rounds);
+
+        if (rounds - commitLast <= bufferRounds)
+            commitLast = rounds;
+
+        auto first = commitFirst >= bufferRounds ? commitFirst - bufferRounds : 0;
+        addWindow(commitWindows, first, std::min(commitLast + bufferRounds, rounds), commitFirst, commitLast);
+
+        if (commitLast == rounds)
+            break;
+
+        addWindow(gapWindows, commitLast, commitLast + bufferRounds, commitLast, commitLast + bufferRounds);
+        commitFirst = commitLast + bufferRounds;
+    }
+
+    if (numThreads > 1)
+        pool = std::make_unique<ThreadPool>(numThreads);
+}
+
+void ParallelWindowDecoder::addWindow(std::vector<Window>& windows, unsigned int first, unsigned int last, unsigned int commitFirst, unsigned int commitLast)
+{
+    Window window;
+
+    window.first = first;
+    window.last = last;
+    window.commitFirst = commitFirst;
+    window.commitLast = commitLast;
+
+    window.decoder = std::make_unique<UnionFindDecoder>(distance, last - first, CodeType::ROTATED);
+    window.edge_observables = window.decoder->get_observable_masks();
+
+    windows.push_back(std::move(window));
+}
+
+/*
+    The set_observable_masks function sets the observables flipped by each edge of the
+    lattice of the whole shot (rounds rounds), which are split among the windows.
+
+    @param masks The observable mask of each edge of the lattice of the shot.
+*/
+void ParallelWindowDecoder::set_observable_masks(const std::vector<uint64_t>& masks)
+{
+    if (masks.size() != numEdges)
+        throw std::invalid_argument("There must be exactly one observable mask per edge.");
+
+    auto horizontalEdges = rounds * edgesPerRound;
+
+    for (auto windows : {&commitWindows, &gapWindows})
+    {
+        for (auto& window : *windows)
+        {
+            auto windowHorizontalEdges = window.decoder->getHorizontalEdgeCount();
+
+            for (EdgeIndex edge = 0; edge < (EdgeIndex)window.edge_observables.size(); edge++)
+            {
+                if (edge < (EdgeIndex)windowHorizontalEdges)
+                    window.edge_observables[edge] = masks[window.first * edgesPerRound + edge];
+                else
+                    window.edge_observables[edge] = masks[horizontalEdges + window.first * nodesPerRound + edge - windowHorizontalEdges];
+            }
+        }
+    }
+}
+
+/*
+    The decode_sparse function decodes a shot given as the list of its defects: the
+    commit windows are decoded first, then the gap windows, with the defects left by
+    the corrections committed by the commit windows (see ParallelWindowDecoder).
+
+    @param defects The indices of the defect nodes, in the lattice of the whole shot.
+*/
+void ParallelWindowDecoder::decode_sparse(const std::vector<NodeIndex>& defects)
+{
+    for (auto windows : {&commitWindows, &gapWindows})
+        for (auto& window : *windows)
+            window.defects.clear();
+
+    for (auto node : defects)
+    {
+        unsigned int round = node / nodesPerRound;
+
+        for (auto windows : {&commitWindows, &gapWindows})
+            for (auto& window : *windows)
+                if (window.first <= round && round < window.last)
+                    window.defects.push_back(node - window.first * nodesPerRound);
+    }
+
+    runWindows(commitWindows);
+
+    for (auto& commitWindow : commitWindows)
+    {
+        for (auto node : commitWindow.flips)
+        {
+            unsigned int round = node / nodesPerRound;
+
+            for (auto& gapWindow : gapWindows)
+                if (gapWindow.first <= round && round < gapWindow.last)
+                    gapWindow.defects.push_back(node - gapWindow.first * nodesPerRound);
+        }
+    }
+
+    // A node flipped twice (or a defect flipped once) is not a defect
+    for (auto& gapWindow : gapWindows)
+    {
+        auto& gapDefects = gapWindow.defects;
+        std::sort(gapDefects.begin(), gapDefects.end());
+
+        size_t kept = 0;
+        for (size_t i = 0; i < gapDefects.size(); )
+        {
+            size_t j = i;
+            while (j < gapDefects.size() && gapDefects[j] == gapDefects[i])
+                j++;
+
+            if ((j - i) % 2 == 1)
+                gapDefects[kept++] = gapDefects[i];
+
+            i = j;
+        }
+
+        gapDefects.resize(kept);
+    }
+
+    runWindows(gapWindows);
+
+    predicted_observables = 0;
+
+    for (auto windows : {&commitWindows, &gapWindows})
+        for (auto& window : *windows)
+            predicted_observables ^= window.observables;
+}
+
+/*
+    The decodeWindow function decodes a window and commits the MATCHED edges of its
+    commit region: the horizontal edges of the region and the vertical edges incident
+    to it. A committed vertical edge leaving the region leaves a defect on its other
+    endpoint, in a gap.
+
+    @param window The window to decode.
+*/
+void ParallelWindowDecoder::decodeWindow(Window& window)
+{
+    auto& decoder = *window.decoder;
+    auto horizontalEdges = decoder.getHorizontalEdgeCount();
+
+    decoder.decode_sparse(window.defects);
+
+    window.observables = 0;
+    window.flips.clear();
+
+    for (auto edge : decoder.get_matched_edges())
+    {
+        if (edge < (EdgeIndex)horizontalEdges)
+        {
+            auto round = window.first + edge / edgesPerRound;
+
+            if (window.commitFirst <= round && round < window.commitLast)
+                window.observables ^= window.edge_observables[edge];
+
+            continue;
+        }
+
+        // Vertical edges connect their lower node (in round) with the same node in round + 1
+        auto lowerNode = window.first * nodesPerRound + edge - horizontalEdges;
+        auto round = lowerNode / nodesPerRound;
+
+        if (round + 1 < window.commitFirst || round >= window.commitLast)
+            continue;
+
+        window.observables ^= window.edge_observables[edge];
+
+        if (round + 1 == window.commitFirst)
+            window.flips.push_back(lowerNode);
+        else if (round + 1 == window.commitLast)
+            window.flips.push_back(lowerNode + nodesPerRound);
+    }
+}
+
+/*
+    Decodes the windows of a layer, concurrently if the decoder has a pool of threads.
+*/
+void ParallelWindowDecoder::runWindows(std::vector<Window>& windows)
+{
+    if (pool)
+        pool->run(windows.size(), [&](int i) { decodeWindow(windows[i]); });
+    else
+        for (auto& window : windows)
+            decodeWindow(window);
+}
+
+/*
+    The get_windows function returns the layout of the windows: the commit windows
+    first, then the gap windows.
+
+    @return The (first round, last round + 1, first committed round, last committed round + 1) of each window.
+*/
+std::vector<std::tuple<int, int, int, int>> ParallelWindowDecoder::get_windows()
+{
+    std::vector<std::tuple<int, int, int, int>> layout;
+
+    for (auto windows : {&commitWindows, &gapWindows})
+        for (auto& window : *windows)
+            layout.emplace_back(window.first, window.last, window.commitFirst, window.commitLast);
+
+    return layout;
+}
+
+/*
+    The decode_batch function decodes a batch of bit-packed detection events, as
+    produced by Stim (little endian bit order, one row per shot), and writes the
+    bit-packed observable predictions of each shot. The shots are decoded one after
+    another, each one with its windows decoded concurrently.
+
+    @param detection_events The packed detection events, num_shots rows of num_det_bytes bytes.
+    @param num_shots The number of shots in the batch.
+    @param num_det_bytes The number of bytes of each packed row.
+    @param det_to_node For each detector, the index of the node it is mapped to in the lattice of the shot (-1 if filtered out).
+    @param num_dets The number of detectors in det_to_node.
+    @param predictions The output buffer, num_shots rows of num_obs_bytes bytes.
+    @param num_obs_bytes The number of bytes of each packed prediction (at most 8).
+*/
+void ParallelWindowDecoder::decode_batch(const uint8_t* detection_events, size_t num_shots, size_t num_det_bytes, const int32_t* det_to_node, size_t num_dets, uint8_t* predictions, size_t num_obs_bytes)
+{
+    std::vector<NodeIndex> defects;
+
+    for (size_t shot = 0; shot < num_shots; shot++)
+    {
+        defects.clear();
+        extractDefects(detection_events + shot * num_det_bytes, num_det_bytes, det_to_node, num_dets, numNodes, defects);
+
+        decode_sparse(defects);
+
+        writePrediction(predictions + shot * num_obs_bytes, num_obs_bytes, predicted_observables);
+    }
+}
@@ -0,0 +1,98 @@
+#ifndef _PARALLEL_WINDOW_DECODER_HPP_
+#define _PARALLEL_WINDOW_DECODER_HPP_
+
+#include <vector>
+#include <tuple>
+#include <memory>
+#include <cstdint>
+#include <cstddef>
+#include <stdexcept>
+
+#include "types.hpp"
+#include "union_find.hpp"
+#include "thread_pool.hpp"
+
+/*
+    A decoder for long memory experiments on the rotated lattice, which splits the time
+    axis of a shot in overlapping windows decoded concurrently (sandwich decoding), to
+    bound the latency of a shot rather than to raise the batch throughput.
+
+    The rounds are split in commit regions of commitRounds rounds, separated by gaps of
+    bufferRounds rounds. In the first layer, the window of each commit region (the region
+    with bufferRounds rounds of buffer on each side) is decoded, and the corrections of the
+    region are committed; the committed vertical edges leaving the region leave defects in
+    the gaps. In the second layer, the gaps are decoded with these defects, as windows of
+    their own, and all of their corrections are committed. The windows of a layer share no
+    state, so they run concurrently on the pool.
+*/
+class ParallelWindowDecoder
+{
+public:
+    /*
+        @param distance The distance of the code.
+        @param rounds The number of rounds of the shots.
+        @param commitRounds The number of rounds of each commit region.
+        @param bufferRounds The number of rounds of the buffers (and of the gaps between the commit regions).
+        @param numThreads The number of threads decoding the windows of a layer, 0 or 1 for serial decoding.
+    */
+    ParallelWindowDecoder(unsigned int distance, unsigned int rounds, unsigned int commitRounds, unsigned int bufferRounds, unsigned int numThreads=0);
+
+    void decode_sparse(const std::vector<NodeIndex>& defects);
+
+    uint64_t get_observables() { return predicted_observables; }
+    void set_observable_masks(const std::vector<uint64_t>& masks);
+
+    void decode_batch(const uint8_t* detection_events, size_t num_shots, size_t num_det_bytes, const int32_t* det_to_node, size_t num_dets, uint8_t* predictions, size_t num_obs_bytes=1);
+
+    std::vector<std::tuple<int, int, int, int>> get_windows();
+    unsigned int get_threads() { return pool ? pool->size() : 0; }
+
+    unsigned int distance;
+    unsigned int rounds;
+    unsigned int commitRounds;
+    unsigned int bufferRounds;
+
+private:
+    /*
+        A window of rounds [first, last), decoded by its own decoder.
+
+        @param commitFirst, commitLast The rounds [commitFirst, commitLast) whose corrections are committed.
+        @param defects The defects of the window, as node indices of the window.
+        @param edge_observables The observable mask of each edge of the window.
+        @param observables The observables flipped by the committed corrections.
+        @param flips The nodes (of the shot) where the committed corrections leave a defect.
+    */
+    struct Window
+    {
+        unsigned int first;
+        unsigned int last;
+        unsigned int commitFirst;
+        unsigned int commitLast;
+
+        std::unique_ptr<UnionFindDecoder> decoder;
+
+        std::vector<NodeIndex> defects;
+        std::vector<uint64_t> edge_observables;
+
+        uint64_t observables = 0;
+        std::vector<NodeIndex> flips;
+    };
+
+    unsigned int nodesPerRound;
+    unsigned int edgesPerRound;
+    unsigned int numNodes;
+    unsigned int numEdges;
+
+    std::vector<Window> commitWindows;
+    std::vector<Window> gapWindows;
+
+    std::unique_ptr<ThreadPool> pool;
+
+    uint64_t predicted_observables = 0;
+
+    void addWindow(std::vector<Window>& windows, unsigned int first, unsigned int last, unsigned int commitFirst, unsigned int commitLast);
+    void decodeWindow(Window& window);
+    void runWindows(std::vector<Window>& windows);
+};
+
+#endif
@@ -0,0 +1,411 @@
+#include "repetition_decoder.hpp"
+#include "utils.hpp"
+
+#include <algorithm>
+#include <cstring>
+
+RepetitionDecoder::RepetitionDecoder(unsigned int distance, unsigned int rounds, int diagonalOffset)
+{
+    if (distance < 2)
+        throw std::invalid_argument("The distance of the repetition code must be at least 2.");
+
+    if (diagonalOffset < -1 || diagonalOffset > 1)
+        throw std::invalid_argument("diagonalOffset must be -1, 0 or 1.");
+
+    this->distance = distance;
+    this->rounds = rounds;
+    this->diagonalOffset = diagonalOffset;
+
+    this->cols = distance - 1;
+    this->numNodes = rounds * cols;
+    this->horizontalEdges = rounds * (cols + 1);
+    this->verticalEdges = rounds > 0 ? (rounds - 1) * cols : 0;
+    this->numEdges = horizontalEdges + verticalEdges + (diagonalOffset != 0 ? verticalEdges : 0);
+    this->borderNode = numNodes;
+
+    parent.resize(numNodes + 1);
+    cluster_size.resize(numNodes + 1);
+    parity.resize(numNodes + 1, 0);
+    on_border.resize(numNodes + 1, 0);
+    syndrome.resize(numNodes + 1, 0);
+    next_member.resize(numNodes + 1);
+    forest_degree.resize(numNodes + 1, 0);
+    node_touched.resize(numNodes + 1, 0);
+    odd_queued.resize(numNodes + 1, 0);
+
+    edge_state.resize(numEdges, 0);
+    edge_observables.resize(numEdges, 0);
+    edge_nodes.resize(2 * numEdges, INVALID_NODE);
+
+    for (unsigned int round = 0; round < rounds; round++)
+    {
+        for (unsigned int k = 0; k <= cols; k++)
+        {
+            EdgeIndex edge = round * (cols + 1) + k;
+
+            edge_nodes[2*edge] = k > 0 ? (NodeIndex)(round * cols + k - 1) : BORDER_NODE;
+            edge_nodes[2*edge + 1] = k < cols ? (NodeIndex)(round * cols + k) : BORDER_NODE;
+        }
+
+        // By default, the logical observable is crossed by the right border edges
+        edge_observables[round * (cols + 1) + cols] = 1;
+    }
+
+    for (NodeIndex node = 0; node < (NodeIndex)verticalEdges; node++)
+    {
+        EdgeIndex edge = horizontalEdges + node;
+
+        edge_nodes[2*edge] = node;
+        edge_nodes[2*edge + 1] = node + cols;
+
+        int col = node % cols + diagonalOffset;
+
+        if (diagonalOffset != 0 && col >= 0 && col < (int)cols)
+        {
+            edge = horizontalEdges + verticalEdges + node;
+
+            edge_nodes[2*edge] = node;
+            edge_nodes[2*edge + 1] = node + cols + diagonalOffset;
+        }
+    }
+
+    for (NodeIndex node = 0; node <= borderNode; node++)
+    {
+        parent[node] = node;
+        cluster_size[node] = 1;
+        next_member[node] = node;
+    }
+
+    on_border[borderNode] = 1;
+}
+
+/*
+    The incidentEdges function computes the edges incident to a node from its coordinates.
+
+    @param node The node.
+    @param edges The output array, of at least MAX_DEGREE slots.
+    @return The number of incident edges.
+*/
+int RepetitionDecoder::incidentEdges(NodeIndex node, EdgeIndex* edges)
+{
+    int round = node / cols;
+    int col = node % cols;
+    int degree = 0;
+
+    // Time-like edges come first, so that the ties of a grow step are broken in their favor
+    if (round > 0)
+        edges[degree++] = horizontalEdges + node - cols;
+    if (round < (int)rounds - 1)
+        edges[degree++] = horizontalEdges + node;
+
+    edges[degree++] = round * (cols + 1) + col;
+    edges[degree++] = round * (cols + 1) + col + 1;
+
+    if (diagonalOffset != 0)
+    {
+        if (round < (int)rounds - 1 && col + diagonalOffset >= 0 && col + diagonalOffset < (int)cols)
+            edges[degree++] = horizontalEdges + verticalEdges + node;
+        if (round > 0 && col - diagonalOffset >= 0 && col - diagonalOffset < (int)cols)
+            edges[degree++] = horizontalEdges + verticalEdges + node - cols - diagonalOffset;
+    }
+
+    return degree;
+}
+
+/*
+    The set_observable_masks function sets, for each edge, the mask of the logical
+    observables flipped by an error on the edge (bit i for observable i).
+
+    @param masks The observable mask of each edge, one per edge (see getEdgeCount).
+*/
+void RepetitionDecoder::set_observable_masks(const std::vector<uint64_t>& masks)
+{
+    if (masks.size() != numEdges)
+        throw std::invalid_argument("There must be exactly one observable mask per edge.");
+
+    edge_observables = masks;
+}
+
+/*
+    Resets the nodes touched by the previous shot, and their edges: every other node
+    and edge is still in its initial state.
+*/
+void RepetitionDecoder::reset()
+{
+    EdgeIndex edges[MAX_DEGREE];
+
+    for (auto node : touched_nodes)
+    {
+        parent[node] = node;
+        cluster_size[node] = 1;
+        parity[node] = 0;
+        on_border[node] = 0;
+        syndrome[node] = 0;
+        next_member[node] = node;
+        forest_degree[node] = 0;
+        node_touched[node] = 0;
+
+        int degree = incidentEdges(node, edges);
+        for (int i = 0; i < degree; i++)
+            edge_state[edges[i]] = 0;
+    }
+
+    touched_nodes.clear();
+
+    parent[borderNode] = borderNode;
+    cluster_size[borderNode] = 1;
+    parity[borderNode] = 0;
+    syndrome[borderNode] = 0;
+    next_member[borderNode] = borderNode;
+    forest_degree[borderNode] = 0;
+
+    odd_clusters.clear();
+    forest_edges.clear();
+    predicted_observables = 0;
+}
+
+void RepetitionDecoder::touchNode(NodeIndex node)
+{
+    if (node == borderNode || node_touched[node])
+        return;
+
+    node_touched[node] = 1;
+    touched_nodes.push_back(node);
+}
+
+NodeIndex RepetitionDecoder::find(NodeIndex node)
+{
+    while (parent[node] != node)
+    {
+        parent[node] = parent[parent[node]];
+        node = parent[node];
+    }
+
+    return node;
+}
+
+/*
+    The decode_sparse function decodes a shot given as the list of its defects.
+
+    @param defects The indices of the defect nodes (duplicates are ignored).
+*/
+void RepetitionDecoder::decode_sparse(const std::vector<NodeIndex>& defects)
+{
+    reset();
+
+    for (auto node : defects)
+    {
+        if (node_touched[node])
+            continue;
+
+        touchNode(node);
+
+        syndrome[node] = 1;
+        parity[node] = 1;
+        odd_clusters.push_back(node);
+    }
+
+    growMerge();
+    peel();
+}
+
+/*
+    The growMerge function grows every odd cluster by half an edge from each of its
+    member nodes, then merges the clusters connected by the edges grown to MAX_GROWN,
+    until no odd cluster is left.
+*/
+void RepetitionDecoder::growMerge()
+{
+    EdgeIndex edges[MAX_DEGREE];
+
+    while (odd_clusters.size())
+    {
+        fused_edges.clear();
+
+        for (auto root : odd_clusters)
+        {
+            NodeIndex node = root;
+
+            do
+            {
+                int degree = incidentEdges(node, edges);
+
+                for (int i = 0; i < degree; i++)
+                {
+                    if (edge_state[edges[i]] < MAX_GROWN && ++edge_state[edges[i]] == MAX_GROWN)
+                        fused_edges.push_back(edges[i]);
+                }
+
+                node = next_member[node];
+            } while (node != root);
+        }
+
+        for (auto edge : fused_edges)
+            merge(edge);
+
+        // The surviving odd clusters are the roots of the grown clusters that are still odd
+        next_odd_clusters.clear();
+
+        for (auto root : odd_clusters)
+        {
+            root = find(root);
+
+            if (parity[root] && !on_border[root] && !odd_queued[root])
+            {
+                odd_queued[root] = 1;
+                next_odd_clusters.push_back(root);
+            }
+        }
+
+        for (auto root : next_odd_clusters)
+            odd_queued[root] = 0;
+
+        std::swap(odd_clusters, next_odd_clusters);
+    }
+}
+
+/*
+    The merge function merges the clusters at the endpoints of a fully grown edge
+    (union by size), and adds the edge to the spanning forest. An edge closing a
+    cycle stays grown, but out of the forest.
+
+    @param edge The fully grown edge.
+*/
+void RepetitionDecoder::merge(EdgeIndex edge)
+{
+    auto nodeA = endpoint(edge, 0);
+    auto nodeB = endpoint(edge, 1);
+
+    touchNode(nodeA);
+    touchNode(nodeB);
+
+    auto rootA = find(nodeA);
+    auto rootB = find(nodeB);
+
+    if (rootA == rootB)
+        return;
+
+    if (cluster_size[rootA] < cluster_size[rootB])
+        std::swap(rootA, rootB);
+
+    parent[rootB] = rootA;
+    cluster_size[rootA] += cluster_size[rootB];
+    parity[rootA] ^= parity[rootB];
+    on_border[rootA] |= on_border[rootB];
+
+    // Splicing the two circular lists of members
+    std::swap(next_member[rootA], next_member[rootB]);
+
+    edge_state[edge] = IN_FOREST;
+    forest_edges.push_back(edge);
+    forest_degree[nodeA]++;
+    forest_degree[nodeB]++;
+}
+
+/*
+    The peel function peels the spanning forest from its leaves: the edge of a syndrome
+    leaf is matched, and the syndrome is moved to the other endpoint. The border is never
+    a leaf, so it behaves as the root of the trees touching it.
+*/
+void RepetitionDecoder::peel()
+{
+    EdgeIndex edges[MAX_DEGREE];
+
+    leaves.clear();
+
+    for (auto edge : forest_edges)
+    {
+        for (int side = 0; side < 2; side++)
+        {
+            auto node = endpoint(edge, side);
+
+            if (node != borderNode && forest_degree[node] == 1)
+                leaves.push_back(node);
+        }
+    }
+
+    for (size_t i = 0; i < leaves.size(); i++)
+    {
+        auto leaf = leaves[i];
+
+        // The leaf might have been peeled from the other endpoint of its edge
+        if (forest_degree[leaf] != 1)
+            continue;
+
+        EdgeIndex edge = -1;
+        int degree = incidentEdges(leaf, edges);
+
+        for (int j = 0; j < degree; j++)
+        {
+            if (edge_state[edges[j]] == IN_FOREST)
+            {
+                edge = edges[j];
+                break;
+            }
+        }
+
+        auto other = endpoint(edge, 0) == leaf ? endpoint(edge, 1) : endpoint(edge, 0);
+
+        forest_degree[leaf]--;
+        forest_degree[other]--;
+
+        if (syndrome[leaf])
+        {
+            syndrome[leaf] = 0;
+            syndrome[other] ^= 1;
+            edge_state[edge] = MATCHED;
+            predicted_observables ^= edge_observables[edge];
+        } else
+            edge_state[edge] = PEELED;
+
+        if (other != borderNode && forest_degree[other] == 1)
+            leaves.push_back(other);
+    }
+}
+
+/*
+    The get_matched_edges function returns the MATCHED edges of the last decoding.
+*/
+std::vector<EdgeIndex> RepetitionDecoder::get_matched_edges()
+{
+    std::vector<EdgeIndex> matched;
+
+    for (auto edge : forest_edges)
+    {
+        if (edge_state[edge] == MATCHED)
+            matched.push_back(edge);
+    }
+
+    std::sort(matched.begin(), matched.end());
+
+    return matched;
+}
+
+/*
+    The decode_batch function decodes a batch of bit-packed detection events, as
+    produced by Stim (little endian bit order, one row per shot), and writes the
+    bit-packed observable predictions of each shot. Rows are scanned 64 detectors
+    at a time, so the cost of a shot is dominated by its defects.
+
+    @param detection_events The packed detection events, num_shots rows of num_det_bytes bytes.
+    @param num_shots The number of shots in the batch.
+    @param num_det_bytes The number of bytes of each packed row.
+    @param det_to_node For each detector, the index of the node it is mapped to (-1 if filtered out).
+    @param num_dets The number of detectors in det_to_node.
+    @param predictions The output buffer, num_shots rows of num_obs_bytes bytes.
+    @param num_obs_bytes The number of bytes of each packed prediction (at most 8).
+*/
+void RepetitionDecoder::decode_batch(const uint8_t* detection_events, size_t num_shots, size_t num_det_bytes, const int32_t* det_to_node, size_t num_dets, uint8_t* predictions, size_t num_obs_bytes)
+{
+    std::vector<NodeIndex> defects;
+
+    for (size_t shot = 0; shot < num_shots; shot++)
+    {
+        defects.clear();
+        extractDefects(detection_events + shot * num_det_bytes, num_det_bytes, det_to_node, num_dets, numNodes, defects);
+
+        decode_sparse(defects);
+
+        writePrediction(predictions + shot * num_obs_bytes, num_obs_bytes, predicted_observables);
+    }
+}
@@ -0,0 +1,115 @@
+#ifndef _REPETITION_DECODER_HPP_
+#define _REPETITION_DECODER_HPP_
+
+#include <vector>
+#include <cstdint>
+#include <cstddef>
+#include <stdexcept>
+
+#include "types.hpp"
+
+/*
+    A union-find decoder specialized for the repetition code memory experiment, whose
+    decoding graph is a 2D grid of (distance - 1) nodes per round times the rounds.
+
+    The topology is implicit: the edges of a node are computed from its coordinates,
+    so the decoder only stores flat per-node and per-edge arrays. Clusters are grown by
+    walking the circular list of their member nodes, instead of keeping boundary lists.
+
+    Edges are indexed in a single space: horizontal edges first (round * (cols + 1) + k,
+    connecting column k - 1 and column k, the first and last one with the border), then
+    vertical edges (round * cols + col, connecting a node with the same node in the next
+    round), then diagonal edges (round * cols + col, connecting a node with the node of
+    column col + diagonalOffset in the next round).
+*/
+class RepetitionDecoder
+{
+public:
+    /*
+        @param distance The distance of the code (distance - 1 nodes per round).
+        @param rounds The number of rounds of detectors.
+        @param diagonalOffset The column offset of the space-time diagonal edges (-1, +1, or 0 for no diagonal edges).
+    */
+    RepetitionDecoder(unsigned int distance, unsigned int rounds, int diagonalOffset=0);
+
+    void decode_sparse(const std::vector<NodeIndex>& defects);
+
+    uint64_t get_observables() { return predicted_observables; }
+    void set_observable_masks(const std::vector<uint64_t>& masks);
+    std::vector<uint64_t> get_observable_masks() { return edge_observables; }
+    std::vector<EdgeIndex> get_matched_edges();
+
+    void decode_batch(const uint8_t* detection_events, size_t num_shots, size_t num_det_bytes, const int32_t* det_to_node, size_t num_dets, uint8_t* predictions, size_t num_obs_bytes=1);
+
+    inline unsigned int getNodeCount() { return numNodes; }
+    inline unsigned int getEdgeCount() { return numEdges; }
+
+    unsigned int distance;
+    unsigned int rounds;
+    int diagonalOffset;
+
+    // The two endpoints of each edge (BORDER_NODE for the border, INVALID_NODE for missing diagonal edges)
+    std::vector<NodeIndex> edge_nodes;
+
+private:
+    // A node has a left, right, lower, upper edge and up to two diagonal edges
+    static const int MAX_DEGREE = 6;
+
+    // Edges of the spanning forest, which are the only ones peeled
+    static const EdgeState IN_FOREST = MAX_GROWN + 1;
+
+    unsigned int cols;
+    unsigned int numNodes;
+    unsigned int numEdges;
+    unsigned int horizontalEdges;
+    unsigned int verticalEdges;
+
+    // The border is a node of its own (index numNodes), which is never odd
+    NodeIndex borderNode;
+
+    /*
+        Node arrays (indexed by NodeIndex, borderNode included).
+
+        @param parent The parent of the node in the union-find forest.
+        @param cluster_size The number of nodes in the cluster (roots only).
+        @param parity The parity of the number of syndromes in the cluster (roots only).
+        @param on_border 1 if the cluster touches the border (roots only).
+        @param syndrome 1 if the node is a syndrome, updated by the peeling.
+        @param next_member The next node in the circular list of the members of the cluster.
+        @param forest_degree The number of unpeeled spanning forest edges incident to the node.
+        @param node_touched 1 if the node has been touched by the current shot (see touched_nodes).
+    */
+    std::vector<NodeIndex> parent;
+    std::vector<uint32_t> cluster_size;
+    std::vector<uint8_t> parity;
+    std::vector<uint8_t> on_border;
+    std::vector<uint8_t> syndrome;
+    std::vector<NodeIndex> next_member;
+    std::vector<uint8_t> forest_degree;
+    std::vector<uint8_t> node_touched;
+    std::vector<uint8_t> odd_queued;
+
+    std::vector<EdgeState> edge_state;
+    std::vector<uint64_t> edge_observables;
+
+    std::vector<NodeIndex> touched_nodes;
+    std::vector<NodeIndex> odd_clusters;
+    std::vector<NodeIndex> next_odd_clusters;
+    std::vector<EdgeIndex> fused_edges;
+    std::vector<EdgeIndex> forest_edges;
+    std::vector<NodeIndex> leaves;
+
+    uint64_t predicted_observables = 0;
+
+    int incidentEdges(NodeIndex node, EdgeIndex* edges);
+    inline NodeIndex endpoint(EdgeIndex edge, int side) { return edge_nodes[2*edge + side] == BORDER_NODE ? borderNode : edge_nodes[2*edge + side]; }
+
+    void reset();
+    void touchNode(NodeIndex node);
+    NodeIndex find(NodeIndex node);
+    void growMerge();
+    void merge(EdgeIndex edge);
+    void peel();
+};
+
+#endif
@@ -0,0 +1,80 @@
+#include "thread_pool.hpp"
+
+ThreadPool::ThreadPool(unsigned int numThreads)
+{
+    nextTask = 0;
+
+    for (unsigned int i = 1; i < numThreads; i++)
+        workers.emplace_back(&ThreadPool::workerLoop, this);
+}
+
+ThreadPool::~ThreadPool()
+{
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        stopping = true;
+    }
+
+    workReady.notify_all();
+
+    for (auto& worker : workers)
+        worker.join();
+}
+
+void ThreadPool::run(int numTasks, const std::function<void(int)>& task)
+{
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+
+        currentTask = &task;
+        this->numTasks = numTasks;
+        nextTask = 0;
+        busyWorkers = workers.size();
+        generation++;
+    }
+
+    workReady.notify_all();
+
+    // The calling thread works too, then waits for the workers to drain the tasks
+    runTasks();
+
+    std::unique_lock<std::mutex> lock(mutex);
+    workDone.wait(lock, [this] { return busyWorkers == 0; });
+
+    currentTask = nullptr;
+}
+
+void ThreadPool::runTasks()
+{
+    int task;
+
+    while ((task = nextTask++) < numTasks)
+        (*currentTask)(task);
+}
+
+void ThreadPool::workerLoop()
+{
+    unsigned long seenGeneration = 0;
+
+    while (true)
+    {
+        {
+            std::unique_lock<std::mutex> lock(mutex);
+            workReady.wait(lock, [this, seenGeneration] { return stopping || generation != seenGeneration; });
+
+            if (stopping)
+                return;
+
+            seenGeneration = generation;
+        }
+
+        runTasks();
+
+        {
+            std::lock_guard<std::mutex> lock(mutex);
+
+            if (--busyWorkers == 0)
+                workDone.notify_one();
+        }
+    }
+}
@@ -0,0 +1,58 @@
+#ifndef _THREAD_POOL_HPP_
+#define _THREAD_POOL_HPP_
+
+#include <vector>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <functional>
+#include <atomic>
+
+/*
+    A persistent pool of worker threads, used to run the partitions of a decoding
+    stage concurrently. The threads are created once and wait for work between
+    stages, so that dispatching a stage does not pay for thread creation.
+
+    The calling thread takes part in the execution, so a pool of numThreads threads
+    owns numThreads - 1 workers.
+*/
+class ThreadPool
+{
+public:
+    ThreadPool(unsigned int numThreads);
+    ~ThreadPool();
+
+    ThreadPool(const ThreadPool&) = delete;
+    ThreadPool& operator=(const ThreadPool&) = delete;
+
+    /*
+        Runs task(0), ..., task(numTasks - 1) on the pool and returns when all of them
+        are completed. Tasks are picked dynamically, so numTasks may exceed the number of threads.
+
+        @param numTasks The number of tasks to run.
+        @param task The task to run, called with the index of the task.
+    */
+    void run(int numTasks, const std::function<void(int)>& task);
+
+    inline unsigned int size() { return workers.size() + 1; }
+
+private:
+    void workerLoop();
+    void runTasks();
+
+    std::vector<std::thread> workers;
+
+    std::mutex mutex;
+    std::condition_variable workReady;
+    std::condition_variable workDone;
+
+    const std::function<void(int)>* currentTask = nullptr;
+    int numTasks = 0;
+    std::atomic<int> nextTask;
+
+    unsigned int busyWorkers = 0;
+    unsigned long generation = 0;
+    bool stopping = false;
+};
+
+#endif
@@ -3,65 +3,46 @@
 
 #include <vector>
 #include <tuple>
-
-#define BORDER_ID std::make_tuple(-1, -1, -1)
-#define INVALID_ID std::make_tuple(-2, -2, -2)
+#include <cstdint>
 
 typedef std::tuple<int, int, int> Coords3D;
-typedef int EdgeState;
-
-const EdgeState MAX_GROWN = 2;
-const EdgeState PEELED = -1;
-const EdgeState MATCHED = -2;
-
-// TODO: here, we have some opinable choice. We should clarify if
-//       edges and nodes in both structures should be saved as
-//       with their coordinates or as pointers.
 
 /*
-    The Edge struct represents an edge in the support.
+    Nodes and edges of the lattice are identified by flat int32 indices.
 
-    @param state The state of the edge in the union-find data structure. In weighted union-find,
-                 the state is used to keep track of the current weight of the edge.
-    @param nodeA_coords The coordinates of the first node connected by the edge (by convetion,
-                 the node with the lower row coordinate).
-    @param nodeB_coords The coordinates of the second node connected by the edge (by convetion,
-                 the node with the higher row coordinate).
+    Nodes are indexed as round * (rows * cols) + row * cols + col. Edges are indexed
+    in a single space: horizontal edges first (round * (edgeRows * edgeCols) + row * edgeCols + col),
+    then vertical edges (#horizontal edges + round * (rows * cols) + row * cols + col), where the
+    vertical edge of a node connects it with the same node in the next round.
 */
-struct Edge {
-    EdgeState state;
+typedef int32_t NodeIndex;
+typedef int32_t EdgeIndex;
 
-    Coords3D nodeA_coords = INVALID_ID;
-    Coords3D nodeB_coords = INVALID_ID;
-};
+const NodeIndex BORDER_NODE = -1;
+const NodeIndex INVALID_NODE = -2;
 
 /*
-    The Node struct represents a node in the support.
-
-    @param coords The coordinates of the node in the lattice (#round, #row, #col).
-    @param root_coords The coordinates of the root node in the cluster (#round, #row, #col).
-    @param syndrome true if the node itself is as syndrome, false otherwise.
-    @param ancilla_count The number of nodes in the cluster represented by the node.
-    @param syndrome_count The number of syndromes in the cluster represented by the node.
-    @param on_border true if the cluster touches the border of the lattice, false otherwise.
-    @param boundary Edge pointers that are on the boundary of the cluster.
+    The state of an edge in the union-find data structure. In weighted union-find,
+    the state is used to keep track of the current weight of the edge.
 */
-struct Node {
-    Coords3D coords;
-    Coords3D root_coords;
-    bool syndrome;
-    unsigned int ancilla_count;
-    unsigned int syndrome_count; 
-    bool on_border;
+typedef int8_t EdgeState;
 
-    std::vector<Edge*> boundary;
-    std::vector<Edge*> original_boundary;
-};
+const EdgeState MAX_GROWN = 2;
+const EdgeState PEELED = -1;
+const EdgeState MATCHED = -2;
 
+// A node of the lattices has at most 4 horizontal edges and 2 vertical edges.
+const int MAX_NODE_DEGREE = 6;
+
+/*
+    GRAPH is an arbitrary decoding graph given edge by edge (e.g. built from a detector
+    error model), with no lattice geometry.
+*/
 enum CodeType {
     UNROTATED,
     ROTATED,
-    REPETITION
+    REPETITION,
+    GRAPH
 };
 
-#endif
\ No newline at end of file
+#endif
@@ -2,21 +2,34 @@
 #define _UNION_FIND_HPP_
 
 #include <vector>
-#include <set>
 #include <algorithm>
+#include <cstdint>
+#include <cstddef>
+#include <memory>
+#include <functional>
+#include <stdexcept>
+#include <cstring>
+#include <string>
 
 #include "types.hpp"
 #include "config.hpp"
 #include "utils.hpp"
+#include "thread_pool.hpp"
 
 struct Stats
 {
     int num_grow_merge_iters = 0;
     int num_peeling_iters = 0;
 
+    // Total size of the boundaries of the odd clusters, stale edges included (see grow)
     std::vector<int> boundaries_per_iter;
+    // Number of boundary edges actually grown, without the stale ones
+    std::vector<int> effective_boundaries_per_iter;
     std::vector<int> merges_per_iter;
     std::vector<int> odd_clusters_per_iter;
+    // 1 if the grow step of the iteration swept the whole edge array (see denseGrow); both boundary
+    // counts are then the growth increments of the sweep, as the boundaries are no longer maintained
+    std::vector<int> dense_grow_per_iter;
 
     std::vector<int> peeling_clusters_per_iter;
     std::vector<int> peeling_leaves_per_iter;
@@ -27,14 +40,30 @@ struct Stats
         num_peeling_iters = 0;
 
         boundaries_per_iter.clear();
+        effective_boundaries_per_iter.clear();
         merges_per_iter.clear();
         odd_clusters_per_iter.clear();
+        dense_grow_per_iter.clear();
 
         peeling_clusters_per_iter.clear();
         peeling_leaves_per_iter.clear();
     }
 };
 
+/*
+    Counters of the predecoder (see UnionFindDecoder::set_predecoder), since it was enabled.
+*/
+struct PredecoderStats
+{
+    // Shots decoded with the predecoder, and shots entirely matched by it (union-find skipped)
+    uint64_t shots = 0;
+    uint64_t skipped_shots = 0;
+
+    uint64_t matched_pairs = 0;
+    uint64_t matched_singletons = 0;
+    uint64_t leftover_defects = 0;
+};
+
 class UnionFindDecoder
 {
 public:
@@ -48,47 +77,161 @@ public:
         int peelingParallelParam=1, 
         int earlyStoppingParam=-1, 
         int earlyPeelingParam=-1);
-    ~UnionFindDecoder();
+
+    UnionFindDecoder(
+        unsigned int numNodes, 
+        const std::vector<NodeIndex>& edgeNodes, 
+        int initParallelParam=1, 
+        int growParallelParam=1,
+        int clusterParallelParam=1,
+        int peelingParallelParam=1, 
+        int earlyStoppingParam=-1, 
+        int earlyPeelingParam=-1);
 
     void decode(std::vector<bool>& syndromes);
+    void decode_sparse(const std::vector<NodeIndex>& defects);
 
     void initCluster(std::vector<bool>& syndromes);
-    void initializer(std::vector<bool>& syndromes, int offset, int size);
+    void initializer(std::vector<bool>& syndromes, int offset, int size, std::vector<NodeIndex>& syndrome_nodes);
+    void initSparse(const std::vector<NodeIndex>& defects);
 
-    void grow();
-    void grower(std::vector<Edge*> boundaries, int offset, int size);
+    int grow();
+    void grower(const std::vector<EdgeIndex>& boundaries, int offset, int size);
+    int denseGrow();
 
-    void merge(Edge* edge);
-    Node* find(Node* node);
+    void growMerge();
+    void mergeStage();
+    void merge(EdgeIndex edge);
+    NodeIndex find(NodeIndex node);
     void peel();
 
     std::vector<Coords3D> get_horizontal_corrections();
+    bool get_observable_parity();
+    uint64_t get_observables() { return predicted_observables; }
+    std::vector<EdgeIndex> get_matched_edges() { return getMatchedEdges(); }
+
+    void set_observable_masks(const std::vector<uint64_t>& masks);
+    std::vector<uint64_t> get_observable_masks() { return edge_observables; }
+
+    void decode_batch(const uint8_t* detection_events, size_t num_shots, size_t num_det_bytes, const int32_t* det_to_node, size_t num_dets, uint8_t* predictions, size_t num_obs_bytes=1);
+
+    void set_window(unsigned int commitRounds, unsigned int streamRounds=0);
+    void stream_reset();
+    void stream_round(const std::vector<NodeIndex>& defects);
+    void stream_finish();
+    void decode_stream(const std::vector<NodeIndex>& defects, unsigned int numRounds);
 
     Stats get_stats() { return stats; }
 
+    void set_threads(unsigned int numThreads);
+    unsigned int get_threads() { return pool ? pool->size() : 0; }
+    void set_parallel_merge(bool enabled);
+    void set_parallel_peeling(bool enabled);
+    void set_bit_sliced(bool enabled);
+    void set_dense_grow_threshold(float fraction);
+    void set_predecoder(bool enabled);
+    PredecoderStats get_predecoder_stats() { return predecoder_stats; }
+    void set_boundary_prune_ratio(float ratio);
+    uint64_t get_bit_sliced_shots() { return bit_sliced_shots; }
+
+    std::vector<NodeIndex> get_odd_clusters() { collectOddClusters(); return odd_clusters; }
+
     unsigned int distance;
     unsigned int rounds;
     CodeType codeType;
 
-    // Node nodes[config::ROUNDS][config::NODES_ROWS][config::NODES_COLS];
-    // Edge edge_support[config::ROUNDS][config::EDGES_ROWS][config::EDGES_COLS];
-    // Edge vertical_edge_support[config::ROUNDS][config::NODES_ROWS][config::NODES_COLS];
+    inline unsigned int getNodeRows() { return nodeRows; }
+    inline unsigned int getNodeCols() { return nodeCols; }
+    inline unsigned int getEdgeRows() { return edgeRows; }
+    inline unsigned int getEdgeCols() { return edgeCols; }
+
+    inline unsigned int getNodeCount() { return numNodes; }
+    inline unsigned int getHorizontalEdgeCount() { return rounds * edgeRows * edgeCols; }
+    inline unsigned int getEdgeCount() { return numEdges; }
+    inline unsigned int getMaxNodeDegree() { return maxNodeDegree; }
+
+    inline EdgeIndex getVerticalEdgeIndex(NodeIndex node) { return getHorizontalEdgeCount() + node; }
 
-    inline unsigned int getNodeRows() { return getNodeRowsByCodeAndDistance(codeType, distance); }
-    inline unsigned int getNodeCols() { return getNodeColsByCodeAndDistance(codeType, distance); }
-    inline unsigned int getEdgeRows() { return getEdgeRowsByCodeAndDistance(codeType, distance); }
-    inline unsigned int getEdgeCols() { return getEdgeColsByCodeAndDistance(codeType, distance); }
+    /*
+        Structure-of-arrays representation of the lattice (or of the decoding graph,
+        see CodeType::GRAPH). node_edges, node_degree and edge_nodes are the static
+        topology, built once by the constructor; the other arrays are the dynamic state,
+        reset on every shot.
 
-    Node* nodes;
-    Edge* edge_support;
-    Edge* vertical_edge_support;
+        Node arrays (indexed by NodeIndex):
+        @param parent The parent of the node in the union-find forest (the node itself for roots).
+        @param cluster_size The number of nodes in the cluster represented by the node (roots only).
+        @param parity The parity of the number of syndromes in the cluster represented by the node (roots only).
+        @param on_border 1 if the cluster represented by the node touches the border of the lattice (roots only).
+        @param syndrome 1 if the node itself is a syndrome, 0 otherwise.
+        @param node_edges The maxNodeDegree slots of edges incident to the node, node_degree of them are valid.
+        @param boundary Edges that are on the boundary of the cluster represented by the node (roots only).
+
+        Edge arrays (indexed by EdgeIndex):
+        @param edge_state The state of the edge in the union-find data structure.
+        @param edge_nodes The two nodes connected by the edge (2 * edge and 2 * edge + 1): by convention, nodeA
+                          is the node with the lower row coordinate (or the later round, for vertical edges). 
+                          Missing endpoints are set to BORDER_NODE.
+    */
+    std::vector<NodeIndex> parent;
+    std::vector<uint32_t> cluster_size;
+    std::vector<uint8_t> parity;
+    std::vector<uint8_t> on_border;
+    std::vector<uint8_t> syndrome;
+    std::vector<EdgeIndex> node_edges;
+    std::vector<uint8_t> node_degree;
+    std::vector<std::vector<EdgeIndex>> boundary;
+
+    std::vector<EdgeState> edge_state;
+    std::vector<NodeIndex> edge_nodes;
 
 private:
-    std::set<Node*> odd_clusters;
-    std::vector<Edge*> union_list;
+    unsigned int nodeRows;
+    unsigned int nodeCols;
+    unsigned int edgeRows;
+    unsigned int edgeCols;
+
+    unsigned int numNodes;
+    unsigned int numEdges;
+    // Number of node_edges slots per node (MAX_NODE_DEGREE on the lattices)
+    int maxNodeDegree;
+
+    /*
+        Odd clusters (roots), as a bitmap over the nodes with the number of set bits:
+        membership checks, insertions and removals are O(1). A second level has one bit
+        per non-zero word of the bitmap, so that the flat list odd_clusters is rebuilt at
+        the start of each Grow&Merge iteration (see collectOddClusters) by visiting only
+        the words holding odd roots, already in root order. Growing is a linear scan over it.
+    */
+    std::vector<NodeIndex> odd_clusters;
+    std::vector<uint64_t> odd_cluster_bits;
+    std::vector<uint64_t> odd_cluster_words;
+    size_t num_odd_clusters = 0;
+    std::vector<EdgeIndex> union_list;
+
+    /*
+        Nodes touched by the current shot (defects and nodes that joined a cluster), with
+        a flag per node: they are the only nodes (and their edges the only edges) whose
+        state differs from a clean lattice, so they are the only ones reset by initSparse.
+    */
+    std::vector<NodeIndex> touched_nodes;
+    std::vector<uint8_t> node_touched;
 
     unsigned int max_grown_count = 0;
 
+    /*
+        Logical observables (see set_observable_masks).
+
+        @param edge_observables The mask of the observables flipped by each edge.
+        @param predicted_observables The observables flipped by the edges MATCHED so far, accumulated by the peeling.
+    */
+    std::vector<uint64_t> edge_observables;
+    uint64_t predicted_observables = 0;
+
+    // Spanning forest left by the grow&merge loop and grown degree of its nodes, used for peeling
+    std::vector<EdgeIndex> grown_edges;
+    std::vector<int> grown_degree;
+
     int initParallelParam;
     int growParallelParam;
     int clusterParallelParam;
@@ -98,7 +241,152 @@ private:
 
     Stats stats;
 
-    void peelLeaf(Edge* edge);
+    void allocate();
+    void buildTopology();
+    void buildGraphTopology(const std::vector<NodeIndex>& edgeNodes);
+    void checkBorderReachable();
+    bool oddClustersCanGrow();
+    void clearShotState();
+    void touchNode(NodeIndex node);
+    std::vector<EdgeIndex> getMatchedEdges();
+
+    /*
+        Threaded execution mode (see set_threads): the initParallelParam/growParallelParam
+        partitions of the init and grow stages run concurrently on the pool.
+
+        @param pool The pool of threads owned by the decoder, null in the (default) serial mode.
+        @param partition_syndrome_nodes The syndrome nodes found by each init partition.
+        @param partition_triggers The boundary positions at which each grow partition brought an edge to MAX_GROWN.
+        @param first_grow_position, last_grow_position The first and last boundary position of each edge
+                                                      in the current grow step (INT32_MAX and -1 if absent).
+    */
+    std::unique_ptr<ThreadPool> pool;
+    std::vector<std::vector<NodeIndex>> partition_syndrome_nodes;
+    std::vector<std::vector<int32_t>> partition_triggers;
+    std::vector<int32_t> first_grow_position;
+    std::vector<int32_t> last_grow_position;
+
+    /*
+        Parallel merge mode (see set_parallel_merge).
+
+        @param parallel_merge True if the merge stage uses the parallel merge.
+        @param merged_in_stage 1 for the edges merged by the current parallel merge stage.
+        @param partition_internal_edges, partition_border_edges The edges of each partition merged in parallel and serially.
+        @param partition_linked_roots, partition_forest_edges The roots linked by each partition, and the edges that linked them.
+    */
+    bool parallel_merge = false;
+    std::vector<uint8_t> merged_in_stage;
+    std::vector<std::vector<EdgeIndex>> partition_internal_edges;
+    std::vector<std::vector<EdgeIndex>> partition_border_edges;
+    std::vector<std::vector<NodeIndex>> partition_linked_roots;
+    std::vector<std::vector<EdgeIndex>> partition_forest_edges;
+
+    /*
+        Parallel peeling mode (see set_parallel_peeling and parallelPeel).
+
+        @param parallel_peeling True if the trees of the spanning forest are peeled cluster by cluster.
+        @param peel_links, peel_groups The (root, edge) pairs of the forest sorted by root, and the first pair of each cluster.
+        @param partition_peel_leaves The leaves of the cluster being peeled by each partition.
+        @param partition_leaves_per_step, partition_clusters_per_step The leaves and clusters peeled at each step, per partition.
+        @param partition_peel_observables, partition_peeled The observables flipped and the edges peeled by each partition.
+    */
+    bool parallel_peeling = false;
+    std::vector<std::pair<NodeIndex, EdgeIndex>> peel_links;
+    std::vector<size_t> peel_groups;
+    std::vector<std::vector<NodeIndex>> partition_peel_leaves;
+    std::vector<std::vector<int>> partition_leaves_per_step;
+    std::vector<std::vector<int>> partition_clusters_per_step;
+    std::vector<uint64_t> partition_peel_observables;
+    std::vector<int> partition_peeled;
+
+    /*
+        Bit-sliced batch decoding (see set_bit_sliced and decodeBitSlicedBlock).
+
+        @param bit_sliced True if decode_batch decodes blocks of 64 bit-sliced shots.
+        @param bit_sliced_shots The number of shots resolved by the bit-sliced kernel, without falling back to decode_sparse.
+        @param node_planes The syndrome of each node in the 64 lanes (shots) of the block.
+        @param plane_nodes The nodes with a non-zero plane.
+        @param lane_defects, lane_offsets The defects of each lane (lane_defects[lane_offsets[lane]:lane_offsets[lane + 1]]).
+    */
+    bool bit_sliced = false;
+    uint64_t bit_sliced_shots = 0;
+    std::vector<uint64_t> node_planes;
+    std::vector<NodeIndex> plane_nodes;
+    std::vector<NodeIndex> lane_defects;
+    std::vector<size_t> lane_offsets;
+
+    /*
+        Dense grow mode (see denseGrow).
+
+        @param denseGrowThreshold The boundary fraction above which the grow steps are dense (negative to disable them).
+        @param dense_shot True once the current shot has switched to dense grow steps.
+        @param partition_increments The growth increments applied by each partition of a dense grow step.
+        @param node_odd 1 for the nodes of the odd clusters, during a dense grow step.
+        @param edge_growth The number of endpoints of each edge in an odd cluster, during a dense grow step.
+    */
+    float denseGrowThreshold = -1;
+    bool dense_shot = false;
+    std::vector<int> partition_increments;
+    std::vector<uint8_t> node_odd;
+    std::vector<uint8_t> edge_growth;
+
+    // Stale edge fraction above which a boundary is compacted (see grow and set_boundary_prune_ratio)
+    float boundaryPruneRatio = 0.5;
+
+    /*
+        Sliding window mode (see set_window): the decoder lattice is a window over a longer
+        stream of rounds, which are received one at a time (see stream_round).
+
+        @param commitRounds The oldest rounds of the window whose corrections are committed on each slide, 0 if disabled.
+        @param streamRounds The number of rounds of the streams decoded by decode_batch.
+        @param window_syndrome The syndrome of the rounds of the window, with the defects left by the committed corrections.
+        @param window_fill The number of rounds of the window received so far.
+        @param committed_observables The observables flipped by the corrections committed so far.
+    */
+    unsigned int commitRounds = 0;
+    unsigned int streamRounds = 0;
+    std::vector<uint8_t> window_syndrome;
+    unsigned int window_fill = 0;
+    uint64_t committed_observables = 0;
+
+    void decodeWindow(bool final);
+
+    /*
+        Predecoder stage of decode_sparse (see set_predecoder and predecode).
+
+        @param predecoder True if decode_sparse runs the predecoder first.
+        @param predecoder_defect 1 for the defects of the shot, 2 once matched by the predecoder.
+        @param predecoder_nodes The defects of the shot, without duplicates.
+        @param predecoded_edges, leftover_defects The edges matched by the predecoder, and the defects left to union-find.
+    */
+    bool predecoder = false;
+    PredecoderStats predecoder_stats;
+    std::vector<uint8_t> predecoder_defect;
+    std::vector<NodeIndex> predecoder_nodes;
+    std::vector<EdgeIndex> predecoded_edges;
+    std::vector<NodeIndex> leftover_defects;
+
+    void decodePredecoded(const std::vector<NodeIndex>& defects);
+    void predecode(const std::vector<NodeIndex>& defects);
+    bool isolatedDefect(NodeIndex node, NodeIndex partner);
+
+    void decodeBitSlicedBlock(const uint8_t* detection_events, size_t num_shots, size_t num_det_bytes, const int32_t* det_to_node, size_t num_dets, uint8_t* predictions, size_t num_obs_bytes);
+
+    NodeIndex concurrentFind(NodeIndex node);
+    void parallelMergeStage();
+    void runPartitions(int partitions, const std::function<void(int)>& task);
+
+    void countGrowth(const std::vector<EdgeIndex>& boundaries, int offset, int size);
+    void applyGrowth(const std::vector<EdgeIndex>& boundaries, int offset, int size, std::vector<int32_t>& triggers);
+
+    void parallelPeel();
+    bool peelLeaf(NodeIndex leaf, std::vector<NodeIndex>& next_leaves, uint64_t& observables);
+
+    void insertOddCluster(NodeIndex root);
+    void eraseOddCluster(NodeIndex root);
+    void clearOddClusters();
+    void collectOddClusters();
+    bool isOddCluster(NodeIndex root) const { return (odd_cluster_bits[root >> 6] >> (root & 63)) & 1; }
 };
 
 #endif
\ No newline at end of file
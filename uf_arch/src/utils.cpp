@@ -1,6 +1,6 @@
 #include "utils.hpp"
 
-void print_supports(Node* nodes, Edge* edge_support, unsigned int distance, unsigned int rounds, CodeType codeType)
+void print_supports(const NodeIndex* parent, const uint8_t* syndrome, const EdgeState* edge_support, const NodeIndex* edge_nodes, unsigned int distance, unsigned int rounds, CodeType codeType)
 {
     auto nodeRows = getNodeRowsByCodeAndDistance(codeType, distance);
     auto nodeCols = getNodeColsByCodeAndDistance(codeType, distance);
@@ -15,31 +15,12 @@ void print_supports(Node* nodes, Edge* edge_support, unsigned int distance, unsi
         {
             for (auto j = 0; j < nodeCols; j++)
             {
-                auto node = &nodes[r * nodeRows * nodeCols + i * nodeCols + j];
+                auto node = r * nodeRows * nodeCols + i * nodeCols + j;
 
                 // Print full node
-                std::cout << "Node coords: ";
-                print_coords(node->coords);
-                std::cout << std::endl;
-                
-                std::cout << "Root coords: ";
-                print_coords(node->root_coords);
-                std::cout << std::endl;
-
-                std::cout << "Syndrome: " << (node->syndrome ? "true" : "false") << ", ";
-                std::cout << "Ancilla count: " << node->ancilla_count << ", ";
-                std::cout << "Syndrome count: " << node->syndrome_count << ", ";
-                std::cout << "On border: " << (node->on_border ? "true" : "false") << ", ";
-                std::cout << "Boundary: ";
-                for (auto& edge : node->boundary)
-                {
-                    std::cout << "Edge: ";
-                    print_coords(edge->nodeA_coords);
-                    std::cout << "---";
-                    print_coords(edge->nodeB_coords);
-                    std::cout << " | ";
-                }
-                std::cout << std::endl;
+                std::cout << "Node: " << node << ", ";
+                std::cout << "Parent: " << parent[node] << ", ";
+                std::cout << "Syndrome: " << (syndrome[node] ? "true" : "false") << std::endl;
             }
             std::cout << std::endl;
         }
@@ -50,22 +31,18 @@ void print_supports(Node* nodes, Edge* edge_support, unsigned int distance, unsi
         {
             for (auto j = 0; j < edgeCols; j++)
             {
-                auto edge = &edge_support[r * edgeRows * edgeCols + i * edgeCols + j];
+                auto edge = r * edgeRows * edgeCols + i * edgeCols + j;
 
                 // Print full edge
-                std::cout << "Edge: ";
-                print_coords(edge->nodeA_coords);
-                std::cout << "---";
-                print_coords(edge->nodeB_coords);
-                std::cout << std::endl;
-                std::cout << "State: " << edge->state << std::endl;
+                std::cout << "Edge: " << edge_nodes[2*edge] << "---" << edge_nodes[2*edge + 1] << std::endl;
+                std::cout << "State: " << (int)edge_support[edge] << std::endl;
             }
         }
         std::cout << std::endl;
     }
 }
 
-void print_edge_support_matrix(Edge* edge_support, unsigned int rounds, CodeType codeType, unsigned int distance)
+void print_edge_support_matrix(const EdgeState* edge_support, unsigned int rounds, CodeType codeType, unsigned int distance)
 {
     auto edgeRows = getEdgeRowsByCodeAndDistance(codeType, distance);
     auto edgeCols = getEdgeColsByCodeAndDistance(codeType, distance);
@@ -79,16 +56,16 @@ void print_edge_support_matrix(Edge* edge_support, unsigned int rounds, CodeType
         {
             for (auto j = 0; j < edgeCols; j++)
             {
-                auto edge = &edge_support[r * edgeRows * edgeCols + i * edgeCols + j];
+                auto state = edge_support[r * edgeRows * edgeCols + i * edgeCols + j];
 
-                std::cout << edge->state << " ";
+                std::cout << (int)state << " ";
             }
             std::cout << std::endl;
         }
     }
 }
 
-void print_vertical_edge_support_matrix(Edge* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance)
+void print_vertical_edge_support_matrix(const EdgeState* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance)
 {
     auto nodeRows = getNodeRowsByCodeAndDistance(codeType, distance);
     auto nodeCols = getNodeColsByCodeAndDistance(codeType, distance);
@@ -102,9 +79,9 @@ void print_vertical_edge_support_matrix(Edge* vertical_edge_support, unsigned in
         {
             for (auto j = 0; j < nodeCols; j++)
             {
-                auto edge = &vertical_edge_support[r * nodeRows * nodeCols + i * nodeCols + j];
+                auto state = vertical_edge_support[r * nodeRows * nodeCols + i * nodeCols + j];
 
-                std::cout << edge->state << " ";
+                std::cout << (int)state << " ";
             }
             std::cout << std::endl;
         }
@@ -126,9 +103,9 @@ std::vector<bool> generate_random_syndrome(int size, float probability, int seed
     return syndrome;
 }
 
-std::map<std::string, EdgeState> get_erasure_map(Edge* edge_support, Edge* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance)
+std::map<std::string, int> get_erasure_map(const EdgeState* edge_support, const EdgeState* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance)
 {
-    std::map<std::string, EdgeState> erasure_map;
+    std::map<std::string, int> erasure_map;
 
     auto edgeRows = getEdgeRowsByCodeAndDistance(codeType, distance);
     auto edgeCols = getEdgeColsByCodeAndDistance(codeType, distance);
@@ -141,10 +118,10 @@ std::map<std::string, EdgeState> get_erasure_map(Edge* edge_support, Edge* verti
         {
             for (int j = 0; j < edgeCols; j++)
             {
-                auto edge = &edge_support[r * edgeRows * edgeCols + i * edgeCols + j];
+                auto state = edge_support[r * edgeRows * edgeCols + i * edgeCols + j];
 
                 std::string key = "H(" + std::to_string(r) + "," + std::to_string(i) + "," + std::to_string(j) + ")";
-                erasure_map[key] = edge->state;
+                erasure_map[key] = state;
             }
         }
 
@@ -152,10 +129,10 @@ std::map<std::string, EdgeState> get_erasure_map(Edge* edge_support, Edge* verti
         {
             for (int j = 0; j < nodeCols; j++)
             {
-                auto edge = &vertical_edge_support[r * nodeRows * nodeCols + i * nodeCols + j];
+                auto state = vertical_edge_support[r * nodeRows * nodeCols + i * nodeCols + j];
 
                 std::string key = "V(" + std::to_string(r) + "," + std::to_string(i) + "," + std::to_string(j) + ")";
-                erasure_map[key] = edge->state;
+                erasure_map[key] = state;
             }
         }
     }
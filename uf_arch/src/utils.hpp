@@ -4,6 +4,9 @@
 #include <iostream>
 #include <vector>
 #include <map>
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
 
 #include "types.hpp"
 
@@ -40,10 +43,46 @@ inline unsigned int getEdgeColsByCodeAndDistance(CodeType codeType, unsigned int
         : 0;
 }
 
-void print_supports(Node* nodes, Edge* edge_support, unsigned int distance, unsigned int rounds, CodeType codeType);
-void print_edge_support_matrix(Edge* edge_support, unsigned int rounds, CodeType codeType, unsigned int distance);
-void print_vertical_edge_support_matrix(Edge* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance);
+/*
+    Appends to defects the nodes of the detectors set in a bit-packed row of detection
+    events. The row is scanned 64 detectors at a time, skipping the empty words.
+*/
+inline void extractDefects(const uint8_t* row, size_t num_det_bytes, const int32_t* det_to_node, size_t num_dets, size_t numNodes, std::vector<NodeIndex>& defects)
+{
+    for (size_t byte = 0; byte < num_det_bytes; byte += 8)
+    {
+        uint64_t word = 0;
+        std::memcpy(&word, row + byte, std::min<size_t>(8, num_det_bytes - byte));
+
+        while (word)
+        {
+            auto det = byte * 8 + __builtin_ctzll(word);
+            word &= word - 1;
+
+            if (det >= num_dets)
+                break;
+
+            auto node = det_to_node[det];
+
+            if (node >= 0 && (size_t)node < numNodes)
+                defects.push_back(node);
+        }
+    }
+}
+
+/*
+    Writes the bit-packed prediction of a shot (little endian bit order, as Stim).
+*/
+inline void writePrediction(uint8_t* prediction, size_t num_obs_bytes, uint64_t observables)
+{
+    for (size_t byte = 0; byte < num_obs_bytes; byte++)
+        prediction[byte] = (observables >> (8 * byte)) & 0xFF;
+}
+
+void print_supports(const NodeIndex* parent, const uint8_t* syndrome, const EdgeState* edge_support, const NodeIndex* edge_nodes, unsigned int distance, unsigned int rounds, CodeType codeType);
+void print_edge_support_matrix(const EdgeState* edge_support, unsigned int rounds, CodeType codeType, unsigned int distance);
+void print_vertical_edge_support_matrix(const EdgeState* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance);
 std::vector<bool> generate_random_syndrome(int size, float probability, int seed = -1);
-std::map<std::string, EdgeState> get_erasure_map(Edge* edge_support, Edge* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance);
+std::map<std::string, int> get_erasure_map(const EdgeState* edge_support, const EdgeState* vertical_edge_support, unsigned int rounds, CodeType codeType, unsigned int distance);
 
 #endif
\ No newline at end of file